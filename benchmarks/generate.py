@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Generator of large synthetic programs for benchmarking the assembler.
+"""
+import sys
+import random
+import struct
+import argparse
+
+REGS = ["t0", "t1", "t2", "a0", "a1", "a2", "a3", "s1", "s2"]
+FREGS = ["ft0", "ft1", "ft2", "fa0", "fa1"]
+CONDS = ["beq", "bne", "blt", "bge", "bltu", "bgeu"]
+
+# instructions per label-delimited block
+BLOCK_SIZE = 32
+
+def arith(rnd, block, num_blocks):
+    r = rnd.random()
+    a, b, c = rnd.choice(REGS), rnd.choice(REGS), rnd.choice(REGS)
+    if r < 0.4:
+        return "{} {}, {}, {}".format(rnd.choice(["add", "sub", "mul", "xor", "and", "or"]), a, b, c)
+    elif r < 0.6:
+        return "addi {}, {}, {}".format(a, b, rnd.randint(-2048, 2047))
+    elif r < 0.75:
+        return "lw {}, sp, {}".format(a, 4 * rnd.randint(0, 64))
+    elif r < 0.9:
+        return "sw {}, sp, {}".format(a, 4 * rnd.randint(0, 64))
+    else:
+        return "fadd {}, {}, {}".format(rnd.choice(FREGS), rnd.choice(FREGS), rnd.choice(FREGS))
+
+def short_branch(rnd, block, num_blocks):
+    target = min(max(block + rnd.randint(-2, 2), 0), num_blocks - 1)
+    return "{} {}, {}, L{}".format(rnd.choice(CONDS), rnd.choice(REGS), rnd.choice(REGS), target)
+
+def far_branch(rnd, block, num_blocks):
+    # more than 4KiB away, so that it does not fit in a b-type imm
+    distance = 4096 // (4 * BLOCK_SIZE) + 1
+    candidates = [b for b in [block - distance, block + distance] if 0 <= b < num_blocks]
+    target = rnd.choice(candidates) if candidates else rnd.randrange(num_blocks)
+    if rnd.random() < 0.8:
+        return "{} {}, {}, L{}".format(rnd.choice(CONDS), rnd.choice(REGS), rnd.choice(REGS), target)
+    else:
+        return "j L{}".format(target)
+
+def li(rnd, block, num_blocks):
+    # typically float bit patterns
+    value = struct.unpack('<i', struct.pack('<f', rnd.uniform(-1000, 1000)))[0]
+    return "li {}, {}".format(rnd.choice(REGS), value)
+
+generators = {
+    "arith": arith,
+    "short_branches": short_branch,
+    "far_branches": far_branch,
+    "li": li,
+}
+
+# kind -> weights of generators
+kinds = {
+    "arith": {"arith": 1},
+    "short_branches": {"arith": 3, "short_branches": 1},
+    "far_branches": {"arith": 3, "far_branches": 1},
+    "li": {"arith": 1, "li": 1},
+    "mixed": {"arith": 12, "short_branches": 3, "far_branches": 1, "li": 2},
+}
+
+def generate(kind, num_instructions, seed=0):
+    """
+    Yields lines of a synthetic program.
+
+    Parameters
+    ----------
+    kind : str
+        one of kinds.
+    num_instructions : int
+        number of instructions (before expansion of syntax sugars and long jumps).
+    seed : int, optional
+        seed of the random generator.
+    """
+    rnd = random.Random(seed)
+    names = list(kinds[kind])
+    weights = [kinds[kind][name] for name in names]
+    num_blocks = max(1, num_instructions // BLOCK_SIZE)
+    for i in range(0, num_instructions):
+        block = i // BLOCK_SIZE
+        if i % BLOCK_SIZE == 0:
+            yield "L{}:".format(block)
+        name = rnd.choices(names, weights)[0]
+        yield "    " + generators[name](rnd, min(block, num_blocks - 1), num_blocks)
+    yield "    jalr zero, ra, 0"
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a synthetic program.')
+    parser.add_argument('kind', choices=sorted(kinds))
+    parser.add_argument('num_instructions', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    for line in generate(args.kind, args.num_instructions, args.seed):
+        sys.stdout.write(line + '\n')
+
+if __name__ == '__main__':
+    main()
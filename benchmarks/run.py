@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the assembler and bin2coe on synthetic programs.
+
+Each case runs in a process of its own, so that its peak memory can be measured.
+
+    python3 benchmarks/run.py [--sizes 10000 100000 1000000] [--kinds ...]
+                              [-o results.json] [--baseline old.json]
+"""
+import os
+import sys
+import json
+import time
+import resource
+import platform
+import tempfile
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generate import generate, kinds
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+def run_case(kind, num_instructions):
+    """
+    Run a case in this process, and returns the result.
+    """
+    from cpuex_asm import __version__
+    from cpuex_asm.assembler import Assembler
+    from cpuex_asm.bin2coe import bin2coe
+
+    lines = list(generate(kind, num_instructions))
+    # long jumps are reported to stderr, which is not what we measure
+    sys.stderr = open(os.devnull, 'w')
+
+    start = time.perf_counter()
+    result = Assembler().assemble(lines)
+    asm_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        binary = os.path.join(tmpdir, 'a.bin')
+        with open(binary, 'wb') as f:
+            result.write(f)
+        start = time.perf_counter()
+        with open(os.devnull, 'w') as out:
+            bin2coe(binary, out)
+        bin2coe_seconds = time.perf_counter() - start
+
+    return {
+        "kind": kind,
+        "instructions": num_instructions,
+        "lines": len(lines),
+        "words": len(result.words),
+        "asm_seconds": asm_seconds,
+        "lines_per_second": len(lines) / asm_seconds,
+        "relaxation_passes": result.relaxation_passes,
+        "bin2coe_seconds": bin2coe_seconds,
+        "words_per_second_bin2coe": len(result.words) / bin2coe_seconds if bin2coe_seconds > 0 else None,
+        # KiB on Linux
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "version": __version__,
+    }
+
+def compare(results, baseline):
+    old = {(r["kind"], r["instructions"]): r for r in baseline["results"]}
+    for r in results:
+        key = (r["kind"], r["instructions"])
+        if key not in old:
+            continue
+        print("{:>16} {:>8}: asm x{:.2f}, bin2coe x{:.2f}, peak rss x{:.2f} (vs baseline)".format(
+            r["kind"], r["instructions"],
+            old[key]["asm_seconds"] / r["asm_seconds"],
+            old[key]["bin2coe_seconds"] / r["bin2coe_seconds"],
+            r["peak_rss"] / old[key]["peak_rss"]))
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark the assembler on synthetic programs.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='numbers of instructions')
+    parser.add_argument('--kinds', nargs='+', choices=sorted(kinds), default=sorted(kinds))
+    parser.add_argument('-o', '--output', default='bench_results.json', help='results in JSON (default: %(default)s)')
+    parser.add_argument('--baseline', help='results of a previous run to compare with')
+    parser.add_argument('--case', nargs=2, metavar=('KIND', 'SIZE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        print(json.dumps(run_case(args.case[0], int(args.case[1]))))
+        return
+
+    results = []
+    for num_instructions in args.sizes:
+        for kind in args.kinds:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', kind, str(num_instructions)],
+                                 stdout=subprocess.PIPE, check=True).stdout
+            r = json.loads(out)
+            results.append(r)
+            print("{:>16} {:>8}: {:>10.0f} lines/s, {} passes, bin2coe {:.3f}s, peak rss {} KiB".format(
+                kind, num_instructions, r["lines_per_second"], r["relaxation_passes"],
+                r["bin2coe_seconds"], r["peak_rss"]))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
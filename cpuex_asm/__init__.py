@@ -0,0 +1,15 @@
+__version__ = "0.0.4"
+
+from .errors import AsmError, InstructionNotFoundError, InvalidRegisterError, InvalidArgumentsError, \
+    ImmediateOverflowError, DuplicateLabelError, InvalidLabelError
+
+def __getattr__(name):
+    # imported lazily, so that `python -m cpuex_asm.asm` does not import asm twice,
+    # and that the client of a server (see client.py) starts quickly.
+    if name == 'Assembler':
+        from .assembler import Assembler
+        return Assembler
+    if name in ('AsmResult', 'LineMap'):
+        from . import result
+        return getattr(result, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
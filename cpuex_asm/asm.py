@@ -1,227 +1,442 @@
 #!/usr/bin/env python3
+import os
 import sys
-import struct
-import string
-import re
-from .instructions import instruction_specs
-from .encode import encoder
-from .constant import CONDITIONAL_JUMP_INSTRS
-from .syntax_sugars import syntax_sugar_specs
-
-# utilities for general
-def exit_with_error(fmt):
-    print(fmt)
-    exit(1)
-
-def is_num(s):
-    return re.match(r'^(-)?(0x)?[0-9A-Fa-f][0-9A-Fa-f]*$', s) is not None
+import fcntl
+import itertools
+import argparse
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from .constant import CONDITIONAL_JUMP_INSTRS, FAR_JUMP_INSTRS, STDIO
+from .parser import LO_RE, LABEL, DIRECTIVE, Instruction, parse_line, get_encoder, read_source, location
+from .relax import relax, rebuild, shift
+from .utils import new_words, new_indices, write_words, words_to_bytes
+from .cache import Cache, DEFAULT_MAX_SIZE
+from .objects import ObjectUnit, ObjectStore
+from .result import AsmResult, LineMap
+from .stats import Stats, NULL_STATS, new_stats
+from .server import serve
+from .client import default_socket_path
+from .symbols import write_symbol_table, read_symbols
+from .linetable import build_line_table
+from .directives import directives, relocation_encoders, alignment, SECTIONS, DATA
+from .layout import BlockLayout, read_profile
+from .peephole import JumpThreading
+from .constpool import ConstantPool, SIZE, SPEED
+from .errors import AsmError, InstructionNotFoundError, InvalidArgumentsError, ImmediateOverflowError, \
+    DuplicateLabelError, InvalidLabelError
 
 # utilities for label controll
-def get_raw_label(label):
-    label_inside = re.match(r"^\%lo\((.*)\)$", label)
-    if label_inside is not None:
-        return label_inside.groups()[0]
+def label_to_imm(x, offset, target_offset):
+    if x.is_lo:
+        return target_offset * 4
     else:
-        return label
-    
-def label_to_imm(labels, label, current_offset):
-    label_inside = re.match(r"^\%lo\((.*)\)$", label)
-    if label_inside is not None:
-        label = label_inside.groups()[0]
-        return labels[label] * 4
-    else:
-        return (labels[label] - current_offset) * 4
-    
-def replace_label_by(args, imm):
-    return args[:-1] + [imm]
-
-def get_label_in_args(spec, args):
-    if(spec["type"] in ["b", "i", "s"] \
-       and len(args) == 3 \
-       and not is_num(args[2])):
-        return args[2]
-    elif (spec["type"] in ["j", "u"] \
-          and len(args) == 2 \
-          and not is_num(args[1])):
-        return args[1]
-    elif ('arg_num' in spec \
-          and len(args) == spec['arg_num'] \
-          and not is_num(args[len(args)-1])):
-        return args[len(args)-1]    
-    else:
-        return None
+        return (target_offset - offset) * 4
 
-def has_label(x):
-    return x[3] is not None
+def label_text(x, label):
+    return "%lo({})".format(label) if x.is_lo and not x.name.startswith(".") else label
 
-def is_label_valid(x, labels):
-    return has_label(x) and get_raw_label(x[3]) in labels
+# utilities for encoding
+def encode_by(instr_name, args, filename, line_num, options):
+    try:
+        return (get_encoder(instr_name) or relocation_encoders[instr_name])(args, options)
+    except OverflowError:
+        raise ImmediateOverflowError("overflow occurred at {}".format(location(filename, line_num)),
+                                     filename, line_num)
+    except (IndexError, ValueError):
+        raise InvalidArgumentsError("invalid arguments for {} at {}".format(instr_name, location(filename, line_num)),
+                                    filename, line_num)
+    except AsmError as e:
+        raise e.locate(filename, line_num)
 
-# utilities for instruction controll
-def is_instr(instr_name):
-    return instr_name in instruction_specs
+def encode_directive(name, args, offset, filename, line_num):
+    if name not in directives:
+        raise InstructionNotFoundError("directive not found at {}: {}".format(location(filename, line_num), name),
+                                       filename, line_num)
+    try:
+        return directives[name](args, offset)
+    except OverflowError:
+        raise ImmediateOverflowError("overflow occurred at {}".format(location(filename, line_num)),
+                                     filename, line_num)
+    except (IndexError, ValueError):
+        raise InvalidArgumentsError("invalid arguments for {} at {}".format(name, location(filename, line_num)),
+                                    filename, line_num)
 
-def is_syntax_sugar(instr_name):
-    return instr_name in syntax_sugar_specs
+def in_file(message, filename):
+    # for errors found while linking, which have no line
+    return message if filename is None else "{} in {}".format(message, filename)
 
-def get_spec(instr_name):
-    if is_instr(instr_name):
-        return instruction_specs[instr_name]
-    elif is_syntax_sugar(instr_name):
-        return syntax_sugar_specs[instr_name]
-    else:
-        return None
+def quick_encode(source):
+    """
+    Parse a source, and encode instructions without label references.
 
-# utilities for encoding    
-def encode_by_spec(spec, args, line_num, options):
-    try:
-        if "encoder" in spec:
-            return (spec["encoder"])(spec, args, options)
-        elif "type" in spec:
-            return (encoder[spec["type"]])(spec, args, options)
-        else:
-            return None
-    except OverflowError:
-        exit_with_error("[-] overflow occcuerd at {}".format(line_num))
-    except IndexError:
-        exit_with_error("[-] invalid arguments for {} at {}".format(instr_name,
-                                                                    line_num))
-        
-def quick_encode(lines):
-    parsed_instructions = []
+    Parameters
+    ----------
+    source : iterable of (str, int, str)
+        (filename, line number, line) of each line to be assembled.
+        see parser.read_file.
+
+    Returns
+    -------
+    _ : ObjectUnit
+        the object unit, with every labelled instruction left a word.
+    """
+    instructions = new_words()
+    labelled_instructions = []
+    origins = new_indices()
     labels = {}
-    instructions = []
+    label_ids = {}
+    label_names = []
+    line_offsets = new_indices()
+    line_nums = new_indices()
+    unit_filename = None
+    # .data section
+    is_data = False
+    data = new_words()
+    data_labels = {}
+    data_relocations = []
+    data_align = 1
+
+    def get_label_id(label):
+        if label not in label_ids:
+            label_ids[label] = len(label_names)
+            label_names.append(label)
+        return label_ids[label]
+
+    def relocation(name, args, label, filename, line_num):
+        # directives refer to labels by their addresses
+        return Instruction(name, args, get_label_id(label), True, filename, line_num)
     
-    for line_num, raw_l in map(lambda x: (x[0]+1, x[1]), enumerate(lines)):
-        # pre-processing
-        stripped_line = raw_l.strip().split(';')[0].strip()
-        if stripped_line == '':
-            continue        
-        components = list(map(lambda y: y.strip(), stripped_line.split()))
+    for filename, line_num, raw_l in source:
+        unit_filename = filename
+        try:
+            parsed_line = parse_line(raw_l)
+        except AsmError as e:
+            raise e.locate(filename, line_num)
+        if parsed_line is None:
+            continue
 
         # if the line describes ...
-        if components[0].endswith(':'):
+        kind, content = parsed_line
+        if kind == LABEL:
             # labels
-            label = components[0] [:-1]
-            offset = len(instructions)
-            if label in labels:
-                exit_with_error("[-] label name duplicated: {}".format(label))
-            labels[label] = offset            
+            label = content
+            if label in labels or label in data_labels:
+                raise DuplicateLabelError("label name duplicated at {}: {}".format(location(filename, line_num), label),
+                                          filename, line_num)
+            if is_data:
+                data_labels[label] = len(data)
+            else:
+                labels[label] = len(instructions)
+            get_label_id(label)
+        elif kind == DIRECTIVE:
+            # sections and data
+            name, args = content
+            if name in SECTIONS:
+                is_data = name == DATA
+                continue
+            if is_data:
+                words = encode_directive(name, args, len(data), filename, line_num)
+                if name == ".align":
+                    data_align = max(data_align, alignment(args))
+                for word in words:
+                    if isinstance(word, str):
+                        data_relocations.append((len(data), relocation(name, (word,), word, filename, line_num)))
+                        word = 0
+                    data.append(word)
+                continue
+            words = encode_directive(name, args, len(instructions), filename, line_num)
+            if name == ".align" and alignment(args) > 1:
+                # offsets of instructions are not fixed until they are linked
+                raise InvalidArgumentsError(".align above a word is only supported in .data at {}"
+                                            .format(location(filename, line_num)), filename, line_num)
+            line_offsets.append(len(instructions))
+            line_nums.append(line_num)
+            for word in words:
+                if isinstance(word, str):
+                    labelled_instructions.append(relocation(name, (word,), word, filename, line_num))
+                    origins.append(len(instructions))
+                    word = 0
+                instructions.append(word)
+        elif is_data:
+            raise InvalidArgumentsError("instruction in .data at {}: {}".format(location(filename, line_num),
+                                                                               content[0]),
+                                        filename, line_num)
         else:
             # instructions            
-            instr_name = components[0]
-            args = list(map(lambda x: x.strip(), ' '.join(components[1:]).split(',')))
-            spec = get_spec(instr_name)
+            instr_name, spec, args, target_label = content
             if spec is None:
-                exit_with_error("[-] instruction not found at {}: {}".format(line_num,
-                                                                             instr_name))
-            target_label = get_label_in_args(spec, args)
-            parsed_instruction = [instr_name,
-                                        args,
-                                        len(instructions),
-                                        target_label,
-                                        line_num,
-                                        1]
-            imm_patches = [0] if has_label(parsed_instruction) else asm_instruction(parsed_instruction)
-            parsed_instruction[5] = len(imm_patches)
-            
-            instructions.extend(imm_patches)
-            parsed_instructions.append(parsed_instruction)
+                raise InstructionNotFoundError("instruction not found at {}: {}".format(location(filename, line_num),
+                                                                                        instr_name),
+                                               filename, line_num)
+            line_offsets.append(len(instructions))
+            line_nums.append(line_num)
+            if target_label is None:
+                instructions.extend(encode_by(instr_name,
+                                              args,
+                                              filename,
+                                              line_num,
+                                              {"pc": len(instructions), "current_size": 1, "line_num": line_num}))
+            else:
+                label_inside = LO_RE.match(target_label)
+                is_lo = label_inside is not None
+                label = label_inside.group(1) if is_lo else target_label
+                labelled_instructions.append(Instruction(instr_name,
+                                                         tuple(args),
+                                                         get_label_id(label),
+                                                         is_lo,
+                                                         filename,
+                                                         line_num))
+                origins.append(len(instructions))
+                instructions.append(0)
             
-    return parsed_instructions, instructions, labels
-
-def asm_instruction(parsed_instruction, labels = {}):
-    instr_name, args, offset, target_label, line_num, current_size = parsed_instruction
-    spec = get_spec(instr_name)
-    if has_label(parsed_instruction):
-        return encode_by_spec(spec,
-                              replace_label_by(args,
-                                               label_to_imm(labels,
-                                                            target_label,
-                                                            offset)),
-                              line_num,
-                              {"pc": offset, "current_size": current_size, "line_num": line_num})
-    else:
-        return encode_by_spec(spec, args, line_num, {"pc": offset, "current_size": current_size, "line_num": line_num})
-
-# utilities for label resolution
-def update_instruction_sizes(labelled_instructions, instructions, labels):
-    is_size_changed = False
-    for i in range(0, len(labelled_instructions)):
-        offset = labelled_instructions[i][2]
-        current_size = labelled_instructions[i][5]
-        imm_patches = asm_instruction(labelled_instructions[i], labels)
-        if len(imm_patches) > current_size:
-            diff = len(imm_patches) - current_size                
-            # update current_size
-            labelled_instructions[i][5] = len(imm_patches)
-            # update instructions
-            for _ in range(0, diff):
-                instructions.insert(offset+1, 0)           
-            # update labels
-            for k in labels.keys():
-                if labels[k] > offset:
-                    labels[k] += diff
-            # update info for all instructions with label references
-            for j in range(0, len(labelled_instructions)):
-                if labelled_instructions[j][2] > offset:
-                    labelled_instructions[j][2] += diff
-            # set is_size_changed flag to resolve labels again
-            is_size_changed = True
-    return labelled_instructions, instructions, labels, is_size_changed
+    return ObjectUnit(instructions,
+                      labels,
+                      label_names,
+                      labelled_instructions,
+                      origins,
+                      new_indices([1] * len(labelled_instructions)),
+                      unit_filename,
+                      line_offsets,
+                      line_nums,
+                      data,
+                      data_labels,
+                      data_relocations,
+                      data_align)
 
-# utilities to output asm
-def asm_lines(lines):
+def asm_instruction(x, offset, current_size, target_offset):
+    args = x.args[:-1] + (label_to_imm(x, offset, target_offset),)
+    return encode_by(x.name,
+                     args,
+                     x.filename,
+                     x.line_num,
+                     {"pc": offset, "current_size": current_size, "line_num": x.line_num})
+
+# utilities for object units
+def asm_unit(source, stats=NULL_STATS, transforms=()):
     """
-    Asm given lines and returns machine codes in binary format. 
+    Asm a given source on its own, and returns an object unit to be linked.
 
     Parameters
     ----------
-    lines : list of str
-        lines to be assembled.
+    source : iterable of (str, int, str)
+        (filename, line number, line) of each line to be assembled.
+        see parser.read_file.
+    stats : Stats, optional
+        metrics of the assembly are recorded here.
+    transforms : list of callable, optional
+        passes applied to the source in order, each of which takes a source
+        and stats, and returns a new source (e.g. layout.BlockLayout).
 
     Returns
     -------
-    _ : bytes
-        rv32im machine codes in binary format.
+    _ : ObjectUnit
+        the object unit.
     """
-    
+    for transform in transforms:
+        source = transform(source, stats)
+    with stats.phase("parse"):
+        unit = quick_encode(source)
+    label_offsets = new_indices(unit.labels.get(label, -1) for label in unit.label_names)
+
+    # fix sizes of the instructions which only refer to local labels by pc-relative offsets.
+    # the others are left a word each, so every size is a lower bound of the linked one.
+    local = [i for i, x in enumerate(unit.relocations)
+             if not x.is_lo and label_offsets[x.label] != -1]
+    local_sizes = new_indices(unit.sizes[i] for i in local)
+    with stats.phase("local relaxation"):
+        _, _, unit.relaxation_passes = relax([unit.relocations[i] for i in local],
+              new_indices(unit.origins[i] for i in local),
+              local_sizes,
+              new_indices(unit.relocations[i].label for i in local),
+              label_offsets,
+              asm_instruction)
+    for i, size in zip(local, local_sizes):
+        unit.sizes[i] = size
+
+    return unit
+
+def link(units, stats=NULL_STATS, data_base=None):
+    """
+    Link object units.
+
+    Parameters
+    ----------
+    units : list of ObjectUnit
+        object units to be linked, in order.
+    stats : Stats, optional
+        metrics of the assembly are recorded here.
+    data_base : int, optional
+        address (in bytes) of a separate data segment to put .data sections in,
+        which must meet the alignment of every .align in them. if not given,
+        they follow the instructions, padded to the largest alignment.
+
+    Returns
+    -------
+    _ : AsmResult
+        rv32im machine codes, labels and the line map.
+    """
+    instructions = new_words()
+    labels = {}
+    data = new_words()
+    data_labels = {}
+    data_relocations = []
+    data_targets = new_indices()
+    label_ids = {}
+    label_names = []
+    labelled_instructions = []
+    origins = new_indices()
+    sizes = new_indices()
+    targets = new_indices()
+    bases = []
+    # the largest alignment of .data sections (in words)
+    data_align = 1
+    with stats.phase("link"):
+        for unit in units:
+            if data_base is not None and (data_base // 4) % unit.data_align != 0:
+                raise InvalidArgumentsError(in_file("data base 0x{:08x} is not aligned to {} bytes as .align requires"
+                                                    .format(data_base, 4 * unit.data_align), unit.filename),
+                                            unit.filename)
+            data_align = max(data_align, unit.data_align)
+            base = len(instructions)
+            bases.append(base)
+            instructions.extend(unit.words)
+            for label, offset in unit.labels.items():
+                if label in labels or label in data_labels:
+                    raise DuplicateLabelError(in_file("label name duplicated: {}".format(label), unit.filename),
+                                              unit.filename)
+                labels[label] = base + offset
+            # .data sections are concatenated, each aligned as it requires
+            data_start = len(data) + (-len(data) % unit.data_align)
+            data.extend(new_words(data_start - len(data)))
+            data.extend(unit.data)
+            for label, offset in unit.data_labels.items():
+                if label in labels or label in data_labels:
+                    raise DuplicateLabelError(in_file("label name duplicated: {}".format(label), unit.filename),
+                                              unit.filename)
+                data_labels[label] = data_start + offset
+            # map local label ids to global ones
+            ids = []
+            for label in unit.label_names:
+                if label not in label_ids:
+                    label_ids[label] = len(label_names)
+                    label_names.append(label)
+                ids.append(label_ids[label])
+            labelled_instructions.extend(unit.relocations)
+            origins.extend(base + origin for origin in unit.origins)
+            sizes.extend(unit.sizes)
+            targets.extend(ids[x.label] for x in unit.relocations)
+            data_relocations.extend((data_start + offset, x) for offset, x in unit.data_relocations)
+            data_targets.extend(ids[x.label] for _, x in unit.data_relocations)
+
+        # data labels are placed after the instructions and padding words up to
+        # the alignment of the data, or at data_base
+        fixed = set()
+        data_label_ids = []
+        padding = -len(instructions) % data_align if data_base is None else 0
+        data_origin = len(instructions) + padding if data_base is None else data_base // 4
+        label_offsets = new_indices()
+        for label_id, label in enumerate(label_names):
+            if label in labels:
+                label_offsets.append(labels[label])
+            elif label in data_labels:
+                label_offsets.append(data_origin + data_labels[label])
+                data_label_ids.append(label_id)
+                if data_base is not None:
+                    fixed.add(label_id)
+            else:
+                label_offsets.append(-1)
 
-    # parse lines & quick encode
-    ################
-    parsed_instructions, instructions, labels = quick_encode(lines)
-    
     # resolve instruction sizes
     ################    
     # first, we have to check the existance of labels.
-    if any(list(map(lambda x: has_label(x) and not is_label_valid(x, labels),
-                       parsed_instructions))):
-        instr = next(filter(lambda x: has_label(x) and not is_label_valid(x, labels), parsed_instructions))
-        target_label = instr[3]
-        line_num = instr[4]
-        exit_with_error("[-] invalid label found at {}: {}".format(line_num, target_label))
+    for x, target in zip(labelled_instructions + [x for _, x in data_relocations], targets + data_targets):
+        if label_offsets[target] == -1:
+            raise InvalidLabelError("invalid label found at {}: {}".format(location(x.filename, x.line_num),
+                                                                          label_text(x, label_names[target])),
+                                    x.filename, x.line_num)
 
     # second, we have to fix the size of each labelled instruction.
-    # here we assume that the bigger the imm is, the more space is used.
-    is_size_changed = True
-    labelled_instructions = list(filter(has_label, parsed_instructions))
-    while is_size_changed:
-        labelled_instructions, instructions, labels, is_size_changed = \
-            update_instruction_sizes(labelled_instructions, instructions, labels)
+    with stats.phase("relaxation"):
+        passes = 0
+        while True:
+            patches, final_offsets, n = relax(labelled_instructions, origins, sizes, targets, label_offsets,
+                                              asm_instruction, fixed)
+            passes += n
+            # the text has grown, so the padding may have to change. sizes are kept as
+            # lower bounds, and grow until the padding is stable.
+            text_size = len(instructions) + sum(sizes) - len(sizes)
+            new_padding = -text_size % data_align if data_base is None else 0
+            if new_padding == padding:
+                break
+            for label_id in data_label_ids:
+                label_offsets[label_id] += new_padding - padding
+            padding = new_padding
+        label_offsets = final_offsets
+    labels = {label: label_offsets[label_ids[label]] for label in itertools.chain(labels, data_labels)}
 
     # resolve labels and emit
     ################
     # after fixing the size of instructions, we can patch all the labels with imm!
-    for labelled_instruction in labelled_instructions:
-        offset = labelled_instruction[2]
-        imm_patches = asm_instruction(labelled_instruction, labels)
-        for j in range(0, len(imm_patches)):
-            instructions[offset+j] |= imm_patches[j]
-            
-    # pack all instructions
-    ################
-    assembled_code = b''.join([struct.pack('<I', instr) for instr in instructions])
-    return assembled_code, labels
+    with stats.phase("patch"):
+        instructions = rebuild(instructions, origins, sizes, patches)
+        for (offset, x), target in zip(data_relocations, data_targets):
+            data[offset] = asm_instruction(x, offset, 1, label_offsets[target])[0]
+        if data_base is None:
+            instructions.extend(new_words(padding))
+            instructions.extend(data)
+
+    # sweeps of each unit and of the whole program
+    passes += sum(unit.relaxation_passes for unit in units)
+    if stats.enabled:
+        stats.count("files", len(units))
+        stats.count("instructions", sum(len(unit.line_nums) for unit in units))
+        stats.count("labels", len(labels))
+        stats.count("labelled instructions", len(labelled_instructions))
+        stats.count("relaxation passes", passes)
+        stats.count("long jumps", sum(1 for x, size in zip(labelled_instructions, sizes)
+                                      if size > 1 and x.name in CONDITIONAL_JUMP_INSTRS))
+        stats.count("far jumps", sum(1 for x, size in zip(labelled_instructions, sizes)
+                                     if size > (2 if x.name in CONDITIONAL_JUMP_INSTRS else 1) and
+                                     x.name in FAR_JUMP_INSTRS))
+        stats.count("words", len(instructions))
+        stats.count("data words", len(data))
+
+    def build_line_map():
+        offsets = new_indices()
+        line_nums = new_indices()
+        file_ids = new_indices()
+        for i, (unit, base) in enumerate(zip(units, bases)):
+            offsets.extend(base + offset for offset in unit.line_offsets)
+            line_nums.extend(unit.line_nums)
+            file_ids.extend([i] * len(unit.line_nums))
+        return LineMap(shift(offsets, origins, sizes),
+                       line_nums,
+                       file_ids,
+                       [unit.filename for unit in units])
+
+    return AsmResult(instructions, labels, build_line_map, passes, stats if stats.enabled else None,
+                     data if data_base is not None else None, data_base)
+
+# utilities to output asm
+def asm_lines(lines):
+    """
+    Asm given lines and returns machine codes in binary format. 
+
+    Parameters
+    ----------
+    lines : list of str
+        lines to be assembled.
+
+    Returns
+    -------
+    _ : (array of int, dict)
+        rv32im machine codes as an array of 32-bit words
+        (use utils.write_words to write them out), and labels.
+    """
+    stats = new_stats()
+    result = link([asm_unit(((None, line_num, l) for line_num, l in enumerate(lines, 1)), stats)], stats)
+    stats.finish()
+    return result.words, result.labels
 
 def asm_line(l):
     """
@@ -237,10 +452,91 @@ def asm_line(l):
     _ : bytes
         a rv32im machine code in binary formats.
     """
-    asm_lines([l])
+    return words_to_bytes(asm_lines([l])[0])
 
  
-def asm_files(flist):
+def asm_source(filename, stats=NULL_STATS, transforms=()):
+    return asm_unit(read_source(filename), stats, transforms)
+
+def transforms_key(transforms):
+    """
+    Returns a digest of the options of given passes.
+    """
+    return b''.join(transform.key() for transform in transforms)
+
+def link_files(flist, objects=None, jobs=1, stats=None, transforms=(), data_base=None):
+    """
+    Asm given files and link them.
+
+    Parameters
+    ----------
+    flist : list of str
+        file names to be assembled. STDIO stands for stdin, which is
+        read in this process and never stored as an object.
+    objects : ObjectStore, optional
+        if given, object units of unchanged files are reused from it.
+    jobs : int, optional
+        number of processes to assemble files with. files are assembled
+        into object units in parallel, and linked in the given order.
+    stats : Stats, optional
+        metrics of the assembly are recorded here. if not given, they are
+        only recorded (and passed to the hooks) while any hook is registered.
+    transforms : list of callable, optional
+        passes applied to each source (see asm_unit).
+    data_base : int, optional
+        address (in bytes) of a separate data segment (see link).
+
+    Returns
+    -------
+    _ : AsmResult
+        rv32im machine codes, labels and the line map.
+    """
+    is_owner = stats is None
+    if is_owner:
+        stats = new_stats()
+
+    units = [None] * len(flist)
+    keys = {}
+    if objects is not None:
+        with stats.phase("load objects"):
+            salt = transforms_key(transforms)
+            for i, filename in enumerate(flist):
+                if filename != STDIO:
+                    keys[i] = objects.key(filename, salt)
+                    units[i] = objects.load(keys[i])
+    missing = [i for i, unit in enumerate(units) if unit is None]
+    if stats.enabled and objects is not None:
+        stats.count("object hits", len(flist) - len(missing))
+
+    in_pool = [i for i in missing if flist[i] != STDIO]
+    if jobs > 1 and len(in_pool) > 1:
+        # phases of each unit are not visible from here
+        with stats.phase("assemble units"):
+            with ProcessPoolExecutor(max_workers=min(jobs, len(in_pool))) as pool:
+                assembled = pool.map(partial(asm_source, transforms=transforms), [flist[i] for i in in_pool])
+                # stdin is read here while the others are assembled
+                for i in missing:
+                    if flist[i] == STDIO:
+                        units[i] = asm_source(flist[i], NULL_STATS, transforms)
+                for i, unit in zip(in_pool, assembled):
+                    units[i] = unit
+    else:
+        for i in missing:
+            units[i] = asm_source(flist[i], stats, transforms)
+
+    if objects is not None:
+        with stats.phase("store objects"):
+            for i in missing:
+                if i in keys:
+                    objects.store(keys[i], units[i])
+            if keys:
+                objects.evict()
+    result = link(units, stats, data_base)
+    if is_owner:
+        stats.finish()
+    return result
+
+def asm_files(flist, objects=None, jobs=1):
     """
     Asm given files and returns machine codes in binary format.
 
@@ -248,29 +544,153 @@ def asm_files(flist):
     ----------
     flist : list of str
         file names to be assembled.
+    objects : ObjectStore, optional
+        if given, object units of unchanged files are reused from it.
+    jobs : int, optional
+        number of processes to assemble files with.
 
     Returns
     -------
-    _ : bytes
-        rv32im machine codes in binary format.
+    _ : (array of int, dict)
+        rv32im machine codes as an array of 32-bit words
+        (use utils.write_words to write them out), and labels.
     """
-    lines = []
-    for filename in flist:
-        with open(filename, 'r') as f:
-            lines.extend(f.read().strip().split('\n'))
-    return asm_lines(lines)
-
-# TODO: make this argument handling rich if needed
-def main():
-    if len(sys.argv) <= 2:
-        print("{} <output binary name> <hoge.S> [<foobar.S> ...]".format(sys.argv[0]))
-        exit(1)
-
-    mcode, labels = asm_files(sys.argv[2:])
-    with open(sys.argv[1], 'wb') as f:
-        f.write(mcode)
-    with open(sys.argv[1] + '.symbols', 'w') as f:
+    result = link_files(flist, objects, jobs)
+    return result.words, result.labels
+
+def write_output(output, mcode, labels):
+    with open(output, 'wb') as f:
+        write_words(f, mcode)
+    with open(output + '.symbols', 'w') as f:
         f.write('\n'.join(map(lambda x: '{} {}'.format(x[0], str(4 * x[1])), labels.items())))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='rv32im assembler.')
+    parser.add_argument('output', nargs='?',
+                        help='output binary name (symbols go to <output>.symbols), or - for stdout')
+    parser.add_argument('sources', nargs='*', help='source files to be assembled (- for stdin)')
+    parser.add_argument('--symbols-fd', type=int, metavar='FD',
+                        help='write symbols to this file descriptor (e.g. 3 with `3>symbols`) '
+                        'instead of <output>.symbols. the cache is not used.')
+    parser.add_argument('--cache-dir', default=os.environ.get('CPUEX_ASM_CACHE_DIR'),
+                        help='reuse binaries assembled from the same sources '
+                        '(default: $CPUEX_ASM_CACHE_DIR, disabled if not set)')
+    parser.add_argument('--cache-size', type=int,
+                        default=int(os.environ.get('CPUEX_ASM_CACHE_SIZE', DEFAULT_MAX_SIZE)),
+                        help='max size of the cache in bytes (default: $CPUEX_ASM_CACHE_SIZE or %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help='neither read nor update the cache')
+    parser.add_argument('--obj-dir', default=os.environ.get('CPUEX_ASM_OBJ_DIR'),
+                        help='keep an object unit per source file here, and only re-assemble changed files. '
+                        'units are pickles, so it must be a trusted directory '
+                        '(default: $CPUEX_ASM_OBJ_DIR, disabled if not set)')
+    parser.add_argument('--obj-size', type=int,
+                        default=int(os.environ.get('CPUEX_ASM_OBJ_SIZE', DEFAULT_MAX_SIZE)),
+                        help='max size of --obj-dir in bytes (default: $CPUEX_ASM_OBJ_SIZE or %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='assemble source files with N processes (0: as many as CPUs)', metavar='N')
+    parser.add_argument('--symbol-table', action='store_true',
+                        help='also write a sorted binary symbol table to <output>.symtab (see symbols.SymbolIndex)')
+    parser.add_argument('--line-table', action='store_true',
+                        help='also write a table from pcs to source lines to <output>.lines '
+                        '(see linetable.LineTable). the cache is not read.')
+    parser.add_argument('--profile', help='move blocks not executed in this profile (lines of `<label> <count>`) '
+                        'to the end of each source, so that hot blocks sit together')
+    parser.add_argument('--cold-threshold', type=int, default=0,
+                        help='with --profile, blocks executed no more than this are moved (default: %(default)s)')
+    parser.add_argument('--thread-jumps', action='store_true',
+                        help='redirect jumps to jumps to their final targets, remove jumps to the next instruction, '
+                        'and report the changes to stderr')
+    parser.add_argument('--const-pool', choices=[SIZE, SPEED],
+                        help='load large constants of li from a pool at the beginning of the image: '
+                        'every one of them (speed), or only those loaded more than once (size)')
+    parser.add_argument('--data-base', type=lambda x: int(x, 0), metavar='ADDR',
+                        help='put .data sections in a separate segment at this address (in bytes), '
+                        'and write it to <output>.data. the cache is not used.')
+    parser.add_argument('--stats', action='store_true',
+                        help='print wall time of each phase and counts of instructions, labels, etc. to stderr')
+    parser.add_argument('--serve', nargs='?', const=default_socket_path(), metavar='SOCKET',
+                        help='keep the tables warm and serve assemblies on a UNIX socket '
+                        '(default: $CPUEX_ASM_SOCKET or %(const)s)')
+    parser.add_argument('--no-server', action='store_true', help='assemble in this process even if a server is running')
+    args = parser.parse_args(argv)
+    if args.serve is not None:
+        serve(args.serve)
+        return
+    if args.output is None or not args.sources:
+        parser.error('the following arguments are required: output, sources')
+    if args.data_base is not None and (not 0 <= args.data_base < (1 << 32) or args.data_base % 4 != 0):
+        parser.error('--data-base must be a word-aligned 32-bit address')
+    is_stdout = args.output == STDIO
+    is_stdin = STDIO in args.sources
+    if args.sources.count(STDIO) > 1:
+        parser.error('stdin can be given only once')
+    if is_stdin and args.const_pool is not None:
+        parser.error('--const-pool reads every source beforehand, which cannot be stdin')
+    if is_stdout and (args.symbol_table or args.line_table or args.data_base is not None):
+        parser.error('--symbol-table, --line-table and --data-base write files beside the output, which cannot be stdout')
+    if args.symbols_fd is not None:
+        if is_stdout and args.symbols_fd == 1:
+            parser.error('--symbols-fd 1 would mix the symbols into the binary on stdout')
+        # checked before assembling, not to leave a binary without its symbols
+        try:
+            writable = fcntl.fcntl(args.symbols_fd, fcntl.F_GETFL) & (os.O_WRONLY | os.O_RDWR)
+        except OSError:
+            parser.error('--symbols-fd {} is not an open file descriptor'.format(args.symbols_fd))
+        if not writable:
+            parser.error('--symbols-fd {} is not open for writing'.format(args.symbols_fd))
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    transforms = []
+    if args.profile is not None:
+        transforms.append(BlockLayout(read_profile(args.profile), args.cold_threshold))
+    if args.thread_jumps:
+        transforms.append(JumpThreading())
+    if args.const_pool is not None:
+        transforms.append(ConstantPool.for_files(args.sources, args.const_pool))
+
+    cache = None
+    if args.cache_dir is not None and not args.no_cache and args.data_base is None and \
+       not is_stdin and not is_stdout and args.symbols_fd is None:
+        cache = Cache(args.cache_dir, args.cache_size)
+        key = cache.key(args.sources, transforms_key(transforms))
+        if not args.line_table and cache.load(key, args.output):
+            if args.symbol_table:
+                write_symbol_table(args.output + '.symtab', read_symbols(args.output + '.symbols'))
+            return
+
+    stats = Stats() if args.stats else new_stats()
+    objects = ObjectStore(args.obj_dir, args.obj_size) if args.obj_dir is not None else None
+    try:
+        result = link_files(args.sources, objects, jobs, stats, transforms, args.data_base)
+    except AsmError as e:
+        # not to be mixed with the binary
+        print("[-] {}".format(e), file=sys.stderr if is_stdout else sys.stdout)
+        sys.exit(1)
+    with stats.phase("write"):
+        if is_stdout:
+            write_words(sys.stdout.buffer, result.words)
+            sys.stdout.buffer.flush()
+        elif args.symbols_fd is None:
+            write_output(args.output, result.words, result.labels)
+        else:
+            with open(args.output, 'wb') as f:
+                write_words(f, result.words)
+        if args.symbols_fd is not None:
+            # the descriptor is left open, as the shell opened it
+            with os.fdopen(args.symbols_fd, 'w', closefd=False) as f:
+                f.write(result.symbols())
+        if result.data is not None:
+            with open(args.output + '.data', 'wb') as f:
+                write_words(f, result.data)
+        if args.symbol_table:
+            write_symbol_table(args.output + '.symtab', result.labels)
+        if args.line_table:
+            with open(args.output + '.lines', 'wb') as f:
+                f.write(build_line_table(result.line_map))
+    stats.finish()
+    if args.stats:
+        stats.report()
+    if cache is not None:
+        cache.store(key, args.output)
         
 if __name__ == '__main__':
     main()
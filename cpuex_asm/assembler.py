@@ -0,0 +1,85 @@
+import io
+from .asm import asm_unit, link, link_files
+from .parser import read_lines
+from .stats import new_stats
+
+def to_source(source, filename=None):
+    """
+    Returns a source (an iterable of (filename, line number, line)).
+
+    Parameters
+    ----------
+    source : str, bytes-like, file object or iterable of str
+        assembly code, a file object to read it from, or its lines.
+    filename : str, optional
+        file name to be reported in errors and the line map.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = bytes(source).decode()
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    return read_lines(source, filename)
+
+class Assembler:
+    """
+    An assembler to be embedded in other programs.
+
+    The instruction tables and the specialized encoders are built once at
+    import time, and shared by every Assembler, so assembling many snippets
+    in a process costs nothing more than the assembly itself.
+    Errors are raised as AsmError (see errors).
+
+    Parameters
+    ----------
+    objects : ObjectStore, optional
+        if given, object units of unchanged files are reused from it.
+    jobs : int, optional
+        number of processes to assemble files with.
+    transforms : list of callable, optional
+        passes applied to each source before it is assembled (e.g. layout.BlockLayout).
+    data_base : int, optional
+        address (in bytes) of a separate data segment for .data sections.
+        if not given, they follow the instructions.
+    """
+    def __init__(self, objects=None, jobs=1, transforms=(), data_base=None):
+        self.objects = objects
+        self.jobs = jobs
+        self.transforms = list(transforms)
+        self.data_base = data_base
+
+    def assemble(self, source, filename=None):
+        """
+        Asm a given source.
+
+        Parameters
+        ----------
+        source : str, bytes-like, file object or iterable of str
+            assembly code, a file object to read it from, or its lines.
+        filename : str, optional
+            file name to be reported in errors and the line map.
+
+        Returns
+        -------
+        _ : AsmResult
+            rv32im machine codes, labels and the line map.
+        """
+        stats = new_stats()
+        result = link([asm_unit(to_source(source, filename), stats, self.transforms)], stats, self.data_base)
+        stats.finish()
+        return result
+
+    def assemble_files(self, flist):
+        """
+        Asm given files.
+
+        Parameters
+        ----------
+        flist : list of str
+            file names to be assembled.
+
+        Returns
+        -------
+        _ : AsmResult
+            rv32im machine codes, labels and the line map.
+        """
+        return link_files(flist, self.objects, self.jobs, transforms=self.transforms, data_base=self.data_base)
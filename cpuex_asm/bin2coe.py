@@ -1,21 +1,86 @@
 import sys
-import struct
+import mmap
+import argparse
+from array import array
+from contextlib import contextmanager
+from .utils import WORD_TYPECODE
 
 template = '''memory_initialization_radix=16;
 memory_initialization_vector={};
 radix=16;'''
 
-def bin2coe(fname):
+# bytes to be decoded at once (must be a multiple of 4)
+CHUNK_SIZE = 1 << 20
+
+@contextmanager
+def open_image(fname):
    with open(fname, 'rb') as f:
-      content = f.read()
-   unpacked_content = ["{:08x}".format(struct.unpack("<I", content[i:i+4])[0]) for i in range(0,len(content),4)]
-   print(template.format(','.join(unpacked_content)))
+      try:
+         content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+      except ValueError:
+         # empty files cannot be mapped
+         yield b''
+         return
+      with content:
+         yield content
+
+def hex_chunks(content, sep):
+   """
+   Yields words in given content as hex strings, chunk by chunk.
+
+   Parameters
+   ----------
+   content : bytes-like
+      little endian words. the last word is padded with zero if needed.
+   sep : str
+      separator between words in a chunk.
+   """
+   with memoryview(content) as view:
+      for i in range(0, len(view), CHUNK_SIZE):
+         chunk = view[i:i+CHUNK_SIZE]
+         if len(chunk) % 4 != 0:
+            chunk = bytes(chunk) + bytes(4 - len(chunk) % 4)
+         words = array(WORD_TYPECODE)
+         words.frombytes(chunk)
+         # reversing bytes of each word makes its hex digits in the usual order
+         words.byteswap()
+         yield words.tobytes().hex(sep, 4)
+
+def bin2coe(fname, out=sys.stdout):
+   """
+   Convert a binary into a .coe file for Vivado.
+   """
+   head, tail = template.split('{}')
+   with open_image(fname) as content:
+      out.write(head)
+      for i, chunk in enumerate(hex_chunks(content, ',')):
+         if i != 0:
+            out.write(',')
+         out.write(chunk)
+      out.write(tail + '\n')
+
+def bin2mem(fname, out=sys.stdout):
+   """
+   Convert a binary into a .mem file (a word per line) for $readmemh.
+   """
+   with open_image(fname) as content:
+      for chunk in hex_chunks(content, '\n'):
+         out.write(chunk)
+         out.write('\n')
 
 def main():
-   if len(sys.argv) < 2:
-      print("{} <bin file>".format(sys.argv[0]))
-      exit(1)
-   bin2coe(sys.argv[1])
-      
+   parser = argparse.ArgumentParser(description='convert a binary into a .coe (or .mem) file.')
+   parser.add_argument('binary', help='binary file to be converted')
+   parser.add_argument('-o', '--output', help='output file (default: stdout)')
+   parser.add_argument('--mem', action='store_true', help='emit a word per line for $readmemh instead')
+   args = parser.parse_args()
+
+   convert = bin2mem if args.mem else bin2coe
+   if args.output is None:
+      convert(args.binary)
+   else:
+      with open(args.output, 'w') as out:
+         convert(args.binary, out)
+
 if __name__ == '__main__':
    main()
@@ -0,0 +1,94 @@
+from .parser import LABEL, INSTR, DIRECTIVE, parse_or_none
+from .directives import TEXT, DATA
+
+# utilities for control flow
+def is_unconditional_jump(instr_name, args):
+    """
+    Returns True if an instruction never falls through to the next one.
+    """
+    if instr_name in ("j", "tail"):
+        return True
+    # jal zero, label / jalr zero, rs1, imm
+    return instr_name in ("jal", "jalr") and len(args) > 0 and args[0] == 0
+
+class Block:
+    """
+    A label-delimited block of a source.
+
+    Attributes
+    ----------
+    labels : list of str
+        labels at the head of the block.
+    lines : list of (str, int, str)
+        lines of the block (including the labels), as a source.
+    last : (str, list) or None
+        (name, args) of the last instruction, or None if the block has no instruction.
+    """
+    __slots__ = ('labels', 'lines', 'last')
+
+    def __init__(self):
+        self.labels = []
+        self.lines = []
+        self.last = None
+
+    def falls_through(self):
+        return self.last is None or not is_unconditional_jump(*self.last)
+
+def split_sections(source):
+    """
+    Split a source into its text and its .data regions.
+
+    The text stays in order without the regions, so that a block falls through
+    to the next one across them as it does in the image.
+
+    Returns
+    -------
+    _ : (list of (str, int, str), list of (str, int, str))
+        lines of the text, and lines of the regions from each .data to the next
+        .text (both included), as sources.
+    """
+    text, data = [], []
+    is_data = False
+    for line in source:
+        parsed_line = parse_or_none(line[2])
+        section = parsed_line[1][0] if parsed_line is not None and parsed_line[0] == DIRECTIVE else None
+        if section == DATA:
+            is_data = True
+        (data if is_data else text).append(line)
+        if section == TEXT:
+            is_data = False
+    return text, data
+
+def split_blocks(source):
+    """
+    Split a source into label-delimited blocks.
+
+    Lines which cannot be parsed are kept as they are, so that they are
+    reported when the blocks are assembled.
+
+    Returns
+    -------
+    _ : list of Block
+        blocks in the order of the source. the first one may have no label.
+    """
+    blocks = [Block()]
+    for filename, line_num, text in source:
+        parsed_line = parse_or_none(text)
+        if parsed_line is not None:
+            kind, content = parsed_line
+            if kind == LABEL:
+                if blocks[-1].last is not None:
+                    blocks.append(Block())
+                blocks[-1].labels.append(content)
+            elif kind == INSTR:
+                instr_name, _, args, _ = content
+                blocks[-1].last = (instr_name, args)
+        blocks[-1].lines.append((filename, line_num, text))
+    return blocks
+
+def last_line(block):
+    """
+    Returns (filename, line number) of the last line of a block.
+    """
+    filename, line_num, _ = block.lines[-1]
+    return filename, line_num
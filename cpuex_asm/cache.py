@@ -0,0 +1,121 @@
+import os
+import sys
+import glob
+import shutil
+import hashlib
+from . import __version__
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+def hash_file(h, filename, chunk_size=1 << 20):
+    """
+    Feed the length and the content of a file into a hash object.
+    """
+    h.update(os.path.getsize(filename).to_bytes(8, 'little'))
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+
+def tables_digest():
+    """
+    Returns a digest of everything the output depends on besides the sources:
+    the assembler version and the code of this package (including the instruction tables).
+    """
+    h = hashlib.sha256()
+    h.update(__version__.encode())
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for path in sorted(glob.glob(os.path.join(package_dir, '*.py'))):
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.digest()
+
+def evict_lru(entries, max_size):
+    """
+    Remove the least recently used entries until the rest take no more than max_size bytes.
+
+    Parameters
+    ----------
+    entries : list of list of str
+        files of each entry. the mtime of the first one is the time of its last use.
+    max_size : int
+        max total size in bytes.
+    """
+    sized = []
+    for paths in entries:
+        try:
+            stat = os.stat(paths[0])
+            size = stat.st_size + sum(os.path.getsize(path) for path in paths[1:])
+        except OSError:
+            continue
+        sized.append((stat.st_mtime, size, paths))
+
+    total = sum(entry[1] for entry in sized)
+    for _, size, paths in sorted(sized):
+        if total <= max_size:
+            break
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+
+class Cache:
+    """
+    On-disk cache of assembled binaries, keyed by the content of the sources.
+
+    Each entry consists of <key>.bin and <key>.symbols. The mtime of an entry
+    is updated on every hit, and the least recently used entries are evicted
+    once the cache grows beyond max_size bytes.
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.digest = None
+
+    def key(self, flist, salt=b''):
+        if self.digest is None:
+            self.digest = tables_digest()
+        h = hashlib.sha256(self.digest + salt)
+        for filename in flist:
+            hash_file(h, filename)
+        return h.hexdigest()
+
+    def entry(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.bin', base + '.symbols'
+
+    def load(self, key, output):
+        """
+        Copy a cached binary and its symbols to output.
+        Returns False if there is no such entry.
+        """
+        bin_path, symbols_path = self.entry(key)
+        try:
+            shutil.copyfile(bin_path, output)
+            shutil.copyfile(symbols_path, output + '.symbols')
+            os.utime(bin_path)
+            os.utime(symbols_path)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, output):
+        """
+        Put a binary and its symbols into the cache.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for src, dst in zip([output, output + '.symbols'], self.entry(key)):
+                # copy then rename, so that readers never see a partial entry
+                tmp = '{}.{}.tmp'.format(dst, os.getpid())
+                shutil.copyfile(src, tmp)
+                os.replace(tmp, dst)
+            self.evict()
+        except OSError as e:
+            print("[-] failed to update the cache: {}".format(e), file=sys.stderr)
+
+    def evict(self):
+        evict_lru([[bin_path, bin_path[:-len('.bin')] + '.symbols']
+                   for bin_path in glob.glob(os.path.join(self.directory, '*.bin'))],
+                  self.max_size)
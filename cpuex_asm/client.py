@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import stat
+import socket
+from . import __version__
+from .constant import STDIO
+
+# Run for each assembly, so that only cheap modules are imported here: the
+# tables, and the rest of the package, are loaded only if no server takes it.
+
+# environment variables which affect an assembly, forwarded to the server
+FORWARDED_ENV = ['CPUEX_ASM_CACHE_DIR', 'CPUEX_ASM_CACHE_SIZE', 'CPUEX_ASM_OBJ_DIR', 'CPUEX_ASM_OBJ_SIZE']
+
+def default_socket_path():
+    """
+    Returns $CPUEX_ASM_SOCKET, or a socket path in a directory per user under the temporary directory.
+    """
+    return os.environ.get('CPUEX_ASM_SOCKET',
+                          os.path.join(os.environ.get('TMPDIR', '/tmp'), 'cpuex_asm-{}'.format(os.getuid()), 'asm.sock'))
+
+# utilities for permissions
+def is_trusted(st):
+    # owned by this user or root
+    return st.st_uid in (os.getuid(), 0)
+
+def is_private_directory(directory):
+    """
+    Returns True if no other user can replace files in a directory, i.e. it is
+    trusted and writable only by its owner, or sticky (e.g. /tmp).
+    """
+    try:
+        st = os.stat(directory)
+    except OSError:
+        return False
+    return is_trusted(st) and (not st.st_mode & 0o022 or bool(st.st_mode & stat.S_ISVTX))
+
+def is_own_socket(path):
+    """
+    Returns True if a socket was created by this user, in a directory others cannot replace it in.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid() and \
+        is_private_directory(os.path.dirname(os.path.abspath(path)))
+
+def send(sock, message):
+    sock.sendall(json.dumps(message).encode())
+    sock.shutdown(socket.SHUT_WR)
+
+def receive(sock):
+    chunks = []
+    for chunk in iter(lambda: sock.recv(1 << 16), b''):
+        chunks.append(chunk)
+    return json.loads(b''.join(chunks))
+
+def code_digest():
+    """
+    Returns a summary of the code of this package (the version, and the size and
+    mtime of each source), so that a server running other code can be detected
+    without importing the tables.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    files = []
+    with os.scandir(package_dir) as entries:
+        for entry in entries:
+            if entry.name.endswith('.py'):
+                st = entry.stat()
+                files.append([entry.name, st.st_size, st.st_mtime_ns])
+    return [__version__, sorted(files)]
+
+def forward(path, argv):
+    """
+    Ask a server to run an assembly.
+
+    Returns
+    -------
+    _ : int or None
+        exit code, or None if no server is available (or the socket
+        may be someone else's, who would see the arguments).
+    """
+    if not is_own_socket(path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            send(sock, {
+                "digest": code_digest(),
+                "cwd": os.getcwd(),
+                "env": {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ},
+                "argv": argv,
+            })
+            reply = receive(sock)
+    except (OSError, ValueError):
+        return None
+    if reply.get("code") is None:
+        return None
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    return reply["code"]
+
+def main():
+    """
+    Entry point of cpuex_asm: forward the arguments to a server if any,
+    and assemble in this process otherwise.
+    stdin, stdout and other descriptors of this process are not visible
+    from a server, so assemblies which use them are never forwarded.
+    """
+    argv = sys.argv[1:]
+    if not any(arg.startswith(('--serve', '--no-server', '--symbols-fd')) for arg in argv) and \
+       STDIO not in argv:
+        code = forward(default_socket_path(), argv)
+        if code is not None:
+            sys.exit(code)
+
+    from .asm import main
+    main(argv)
@@ -1 +1,4 @@
 CONDITIONAL_JUMP_INSTRS = ["beq", "bne", "blt", "bge", "bltu", "bgeu"]
+FAR_JUMP_INSTRS = CONDITIONAL_JUMP_INSTRS + ["jal", "j", "call", "tail"]
+# a file name which stands for stdin (and stdout for an output)
+STDIO = "-"
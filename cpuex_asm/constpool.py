@@ -0,0 +1,126 @@
+import hashlib
+from collections import Counter
+from .parser import INSTR, parse_or_none, get_encoder, read_file
+from .errors import AsmError
+
+SIZE = "size"
+SPEED = "speed"
+
+# the pool is placed right after a jump at address 0, so that every entry
+# can be loaded with lw rd, zero, %lo(entry) (addresses below 2048 bytes).
+MAX_ENTRIES = 2048 // 4 - 1
+
+POOL_LABEL = "__cpool_{:08x}"
+POOL_END_LABEL = "__cpool_end"
+
+def pooled_value(parsed_line):
+    """
+    Returns the value of a `li` which takes two words as a 32-bit word, or None.
+    """
+    if parsed_line is None or parsed_line[0] != INSTR:
+        return None
+    instr_name, spec, args, target_label = parsed_line[1]
+    if instr_name != "li" or target_label is not None or len(args) != 2 or not isinstance(args[1], int):
+        return None
+    try:
+        if len(get_encoder("li")(args, {})) < 2:
+            return None
+    except (AsmError, OverflowError, IndexError, ValueError):
+        # reported when the line is assembled
+        return None
+    return args[1] & 0xFFFFFFFF
+
+def count_constants(parsed_lines):
+    """
+    Returns 32-bit value -> number of `li` which load it with two words.
+    """
+    counts = Counter()
+    for parsed_line in parsed_lines:
+        value = pooled_value(parsed_line)
+        if value is not None:
+            counts[value] += 1
+    return counts
+
+def choose_constants(counts, mode=SPEED):
+    """
+    Returns the constants to be pooled, in the order of their entries.
+
+    In SPEED mode, every constant is pooled, since a lw takes one instruction
+    instead of two. in SIZE mode, only constants loaded at least twice are, since
+    an entry takes a word as well. the most frequent ones are chosen first.
+    """
+    min_count = 2 if mode == SIZE else 1
+    values = sorted((value for value, count in counts.items() if count >= min_count),
+                    key=lambda value: (-counts[value], value))
+    return values[:MAX_ENTRIES]
+
+class ConstantPool:
+    """
+    A pass which replaces `li` of large constants with loads from a constant pool.
+
+    The pool is put at the beginning of the entry unit, after a jump over it.
+    `li rd, imm` which takes two words (lui + addi) is replaced with
+    `lw rd, zero, %lo(entry)` which takes one.
+
+    Parameters
+    ----------
+    mode : str, optional
+        SPEED (pool every large constant) or SIZE (only those loaded more than once).
+    values : list of int, optional
+        constants to be pooled (see for_files). if not given,
+        they are collected from each source, which must be the entry.
+    entry : str, optional
+        file name of the source to put the pool in, if values are given.
+    """
+    def __init__(self, mode=SPEED, values=None, entry=None):
+        self.mode = mode
+        self.values = values
+        self.entry = entry
+
+    @classmethod
+    def for_files(cls, flist, mode=SPEED):
+        """
+        Returns a pass with constants collected from given files, to be put in the first one.
+        """
+        counts = Counter()
+        for filename in flist:
+            counts.update(count_constants(parse_or_none(text) for _, _, text in read_file(filename)))
+        return cls(mode, choose_constants(counts, mode), flist[0] if flist else None)
+
+    def key(self):
+        return hashlib.sha256(repr(('constant pool', self.mode, self.values, self.entry)).encode()).digest()
+
+    def __call__(self, source, stats):
+        with stats.phase("constant pool"):
+            lines = list(source)
+            parsed_lines = [parse_or_none(text) for _, _, text in lines]
+            if self.values is None:
+                values = choose_constants(count_constants(parsed_lines), self.mode)
+                is_entry = True
+            else:
+                values = self.values
+                is_entry = len(lines) > 0 and lines[0][0] == self.entry
+            pooled = set(values)
+
+            num_loads = 0
+            rewritten = []
+            if is_entry and values:
+                filename = lines[0][0]
+                rewritten.append((filename, 0, "j {}".format(POOL_END_LABEL)))
+                for value in values:
+                    rewritten.append((filename, 0, "{}:".format(POOL_LABEL.format(value))))
+                    rewritten.append((filename, 0, ".word 0x{:08x}".format(value)))
+                rewritten.append((filename, 0, "{}:".format(POOL_END_LABEL)))
+            for (filename, line_num, text), parsed_line in zip(lines, parsed_lines):
+                value = pooled_value(parsed_line)
+                if value is not None and value in pooled:
+                    rd = parsed_line[1][2][0]
+                    text = "lw x{}, x0, %lo({})".format(rd, POOL_LABEL.format(value))
+                    num_loads += 1
+                rewritten.append((filename, line_num, text))
+
+        if stats.enabled:
+            if is_entry:
+                stats.count("pooled constants", len(values))
+            stats.count("pooled loads", num_loads)
+        return rewritten
@@ -0,0 +1,67 @@
+import struct
+from .parser import LO_RE, is_num
+from .utils import to_int
+
+TEXT = ".text"
+DATA = ".data"
+SECTIONS = (TEXT, DATA)
+
+# each directive takes its arguments and the current offset (in words) in the section,
+# and returns words to be put there. a str in them is a label, to be replaced with its address.
+def encode_word(args, offset):
+    words = []
+    for arg in args:
+        if is_num(arg):
+            value = to_int(arg)
+            if not -(1 << 31) <= value < (1 << 32):
+                raise OverflowError
+            words.append(value & 0xFFFFFFFF)
+        elif arg:
+            # .word label and .word %lo(label) are both the address of label
+            label_inside = LO_RE.match(arg)
+            words.append(label_inside.group(1) if label_inside is not None else arg)
+        else:
+            raise ValueError
+    return words
+
+def encode_float(args, offset):
+    return [struct.unpack('<I', struct.pack('<f', float(arg)))[0] for arg in args]
+
+def encode_space(args, offset):
+    # bytes, rounded up to words
+    if len(args) != 1:
+        raise IndexError
+    size = to_int(args[0])
+    if size < 0:
+        raise ValueError
+    return [0] * ((size + 3) // 4)
+
+def alignment(args):
+    """
+    Returns the alignment (in words) of .align n, i.e. 2^n bytes.
+    """
+    if len(args) != 1:
+        raise IndexError
+    n = to_int(args[0])
+    if not 0 <= n < 32:
+        raise ValueError
+    return max(1, (1 << n) // 4)
+
+def encode_align(args, offset):
+    align = alignment(args)
+    return [0] * (-offset % align)
+
+directives = {
+    ".word": encode_word,
+    ".float": encode_float,
+    ".space": encode_space,
+    ".align": encode_align,
+}
+
+# encoders of directives which refer to labels (see asm.asm_instruction)
+def encode_word_relocation(args, options):
+    return [args[-1] & 0xFFFFFFFF]
+
+relocation_encoders = {
+    ".word": encode_word_relocation,
+}
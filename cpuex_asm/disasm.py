@@ -0,0 +1,239 @@
+import os
+import sys
+import argparse
+from array import array
+from .instructions import instruction_specs
+from .registers import register_aliases
+from .utils import WORD_TYPECODE, bit_to_int
+from .bin2coe import open_image, CHUNK_SIZE
+from .symbols import read_symbols
+
+# utilities for register names
+int_register_names = {}
+float_register_names = {}
+for name, num in register_aliases.items():
+    if name.startswith('f') and name != 'fp':
+        float_register_names.setdefault(num, name)
+    else:
+        int_register_names.setdefault(num, name)
+X = [int_register_names[i] for i in range(32)]
+F = [float_register_names[i] for i in range(32)]
+
+# operands of floating point instructions which are integer registers,
+# by their position in the disassembly (e.g. flw ft0, sp, 0)
+int_operands = {
+    "flw": (1,),
+    "fsw": (1,),
+    "fcvtws": (0,),
+    "fmvxw": (0,),
+    "feq": (0,),
+    "fle": (0,),
+    "fcvtsw": (1,),
+    "fmvwx": (1,),
+}
+
+def register_files(instr_name, num_operands):
+    """
+    Returns register names of each register operand of an instruction.
+    """
+    if not instr_name.startswith('f'):
+        return [X] * num_operands
+    ints = int_operands.get(instr_name, ())
+    return [X if i in ints else F for i in range(num_operands)]
+
+# utilities for decoding
+def imm_i(word):
+    return bit_to_int(word >> 20, 12)
+
+def imm_s(word):
+    return bit_to_int(((word >> 25) << 5) | ((word >> 7) & 0b11111), 12)
+
+def imm_b(word):
+    return bit_to_int(((word >> 31) << 12) | (((word >> 7) & 0b1) << 11) |
+                      (((word >> 25) & 0b111111) << 5) | (((word >> 8) & 0b1111) << 1), 13)
+
+def imm_j(word):
+    return bit_to_int(((word >> 31) << 20) | (((word >> 12) & 0xff) << 12) |
+                      (((word >> 20) & 0b1) << 11) | (((word >> 21) & 0x3ff) << 1), 21)
+
+# each decoder returns (disassembly, offset of the jump target in bytes or None)
+def decoder_r(instr_name, spec):
+    if "rs2" in spec:
+        rd_names, rs1_names = register_files(instr_name, 2)
+        def decode(word):
+            return "{} {}, {}".format(instr_name, rd_names[(word >> 7) & 31], rs1_names[(word >> 15) & 31]), None
+    else:
+        rd_names, rs1_names, rs2_names = register_files(instr_name, 3)
+        def decode(word):
+            return "{} {}, {}, {}".format(instr_name,
+                                          rd_names[(word >> 7) & 31],
+                                          rs1_names[(word >> 15) & 31],
+                                          rs2_names[(word >> 20) & 31]), None
+    return decode
+
+def decoder_i(instr_name, spec):
+    rd_names, rs1_names = register_files(instr_name, 2)
+    def decode(word):
+        return "{} {}, {}, {}".format(instr_name,
+                                      rd_names[(word >> 7) & 31],
+                                      rs1_names[(word >> 15) & 31],
+                                      imm_i(word)), None
+    return decode
+
+def decoder_s(instr_name, spec):
+    rs2_names, rs1_names = register_files(instr_name, 2)
+    def decode(word):
+        return "{} {}, {}, {}".format(instr_name,
+                                      rs2_names[(word >> 20) & 31],
+                                      rs1_names[(word >> 15) & 31],
+                                      imm_s(word)), None
+    return decode
+
+def decoder_b(instr_name, spec):
+    def decode(word):
+        imm = imm_b(word)
+        return "{} {}, {}, {}".format(instr_name, X[(word >> 15) & 31], X[(word >> 20) & 31], imm), imm
+    return decode
+
+def decoder_u(instr_name, spec):
+    def decode(word):
+        return "{} {}, {}".format(instr_name, X[(word >> 7) & 31], word >> 12), None
+    return decode
+
+def decoder_j(instr_name, spec):
+    def decode(word):
+        imm = imm_j(word)
+        return "{} {}, {}".format(instr_name, X[(word >> 7) & 31], imm), imm
+    return decode
+
+decoder = {
+    "r": decoder_r,
+    "i": decoder_i,
+    "s": decoder_s,
+    "b": decoder_b,
+    "u": decoder_u,
+    "j": decoder_j,
+}
+
+# fields which identify an instruction
+MASK_OPCODE = 0x7f
+MASK_FUNCT3 = MASK_OPCODE | (0b111 << 12)
+MASK_FUNCT7 = MASK_FUNCT3 | (0b1111111 << 25)
+
+def instruction_tables(make):
+    """
+    Returns tables from masked words to make(instr_name, spec), built from instruction_specs.
+
+    Returns
+    -------
+    _ : (dict, dict, dict)
+        tables for instructions identified by opcode, funct3 and funct7 (masked with MASK_FUNCT7),
+        by opcode and funct3 (MASK_FUNCT3), and by opcode only (MASK_OPCODE).
+        if several instructions share a key, the first one in instruction_specs wins.
+    """
+    by_funct7 = {}
+    by_funct3 = {}
+    by_opcode = {}
+    for instr_name, spec in instruction_specs.items():
+        key = spec["opcode"]
+        table = by_opcode
+        if "funct3" in spec:
+            key |= spec["funct3"] << 12
+            table = by_funct3
+        if "funct7" in spec:
+            key |= spec["funct7"] << 25
+            table = by_funct7
+        if key not in table:
+            table[key] = make(instr_name, spec)
+    return by_funct7, by_funct3, by_opcode
+
+# masked word -> decoder, built at import time
+by_funct7, by_funct3, by_opcode = instruction_tables(lambda instr_name, spec: decoder[spec["type"]](instr_name, spec))
+
+def decode_word(word):
+    """
+    Decode a word.
+
+    Returns
+    -------
+    _ : (str, int or None)
+        disassembly, and the offset of the jump target (in bytes) if it is a jump.
+    """
+    decode = by_funct7.get(word & MASK_FUNCT7) or by_funct3.get(word & MASK_FUNCT3) or by_opcode.get(word & MASK_OPCODE)
+    if decode is None:
+        return ".word 0x{:08x}".format(word), None
+    return decode(word)
+
+# utilities for images
+def words_in(content):
+    """
+    Yields arrays of words in given content, chunk by chunk.
+    the last word is padded with zero if needed.
+    """
+    with memoryview(content) as view:
+        for i in range(0, len(view), CHUNK_SIZE):
+            chunk = bytes(view[i:i+CHUNK_SIZE])
+            if len(chunk) % 4 != 0:
+                chunk += b'\0' * (4 - len(chunk) % 4)
+            words = array(WORD_TYPECODE, chunk)
+            if sys.byteorder == 'big':
+                words.byteswap()
+            yield words
+
+def disasm(content, symbols=None):
+    """
+    Disassemble a binary, and yields a line per word.
+
+    Parameters
+    ----------
+    content : bytes-like
+        little endian words.
+    symbols : dict, optional
+        address (in bytes) -> label name. targets of jumps are annotated with them.
+    """
+    symbols = symbols or {}
+    pc = 0
+    for words in words_in(content):
+        for word in words:
+            text, offset = decode_word(word)
+            if offset is not None:
+                target = pc + offset
+                text = "{} ; {}".format(text, symbols.get(target, target))
+            yield text
+            pc += 4
+
+def main():
+    parser = argparse.ArgumentParser(description='rv32im disassembler.')
+    parser.add_argument('binary', help='binary to be disassembled')
+    parser.add_argument('-s', '--symbols', help='symbols to annotate jump targets with (default: <binary>.symbols)')
+    parser.add_argument('-o', '--output', help='output file name (default: stdout)')
+    args = parser.parse_args()
+
+    symbols = {}
+    symbols_file = args.symbols if args.symbols is not None else args.binary + '.symbols'
+    if os.path.exists(symbols_file):
+        for name, offset in read_symbols(symbols_file).items():
+            symbols.setdefault(4 * offset, name)
+
+    out = open(args.output, 'w') if args.output is not None else sys.stdout
+    try:
+        with open_image(args.binary) as content:
+            for lines in chunked(disasm(content, symbols)):
+                out.write('\n'.join(lines))
+                out.write('\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+def chunked(lines, size=1 << 14):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+if __name__ == '__main__':
+    main()
@@ -2,110 +2,186 @@ import sys
 
 from .registers import register_to_int
 from .instructions import instruction_specs
-from .utils import to_int, bit_to_int, int_to_bit
-
-# rd, rs1, rs2 
-def encode_r(spec, args, options):
-    if ("rs2" in spec and len(args) == 2) or ("rs2" not in spec and len(args) == 3):
-        rd = register_to_int(args[0])
-        rs1 = register_to_int(args[1])
-        rs2 = spec["rs2"] if "rs2" in spec else register_to_int(args[2])
-        return [
-            spec["opcode"] | (rd << 7) | (spec["funct3"] << 12) | (rs1 << 15) | (rs2 << 20) | (spec["funct7"] << 25) | (spec["rs2"] if "rs2" in spec else 0)
-        ]
-    else:
-        raise IndexError
+from .utils import to_int, bit_to_int
 
+# far jumps
+################
+# a jump beyond the range of jal takes two words, `auipc t, hi` and `jalr rd, t, lo`.
+# t is rd itself, or FAR_JUMP_REGISTER (t1, as `tail` uses) if rd is zero.
+FAR_JUMP_REGISTER = 6
 
-# rd, rs1, imm
-def encode_i(spec, args, options):
-    if len(args) != 3:
-        raise IndexError
-    rd = register_to_int(args[0])
-    rs1 = register_to_int(args[1])
-    imm = int_to_bit(args[2], 12)
-    return [
-        spec["opcode"] | (rd << 7) | (spec["funct3"] << 12) | (rs1 << 15) | (imm << 20) | ((spec["funct7"] << 25) if "func7" in spec else 0)
-    ]
+def fits(imm, bitwidth):
+    return -(1 << (bitwidth-1)) <= imm < (1 << (bitwidth-1))
 
-# rs1, rs2, imm
-def encode_b(spec, args, options):
-    if len(args) != 3:
-        raise IndexError
-
-    try:
-        rs1 = register_to_int(args[0])
-        rs2 = register_to_int(args[1])
-        imm = int_to_bit(args[2], 13)
-    
-        imm11 = (imm & (0b1 << 11)) >> 11
-        imm4to1 = (imm & 0b11110) >> 1
-        imm10to5 = (imm & 0b11111100000) >> 5
-        imm12 = (imm & (0b1 << 12)) >> 12
+def grown_offset(offset, current_size, size):
+    """
+    Returns the offset of a jump target (in bytes, from the first word of the jump)
+    if the jump takes `size` words, given the offset while it takes `current_size` words.
+    targets after the jump move as it grows.
+    """
+    return offset + 4 * (size - current_size) if offset > 0 else offset
+
+def encode_far_jump(rd, offset):
+    """
+    Returns auipc + jalr which jump to (pc of the auipc) + offset, and link rd.
+    """
+    if not fits(offset, 32):
+        raise OverflowError
+    t = rd if rd != 0 else FAR_JUMP_REGISTER
+    lo = bit_to_int(offset & 0xFFF, 12)
+    hi = bit_to_int(((offset - lo) >> 12) & 0xFFFFF, 20)
+    return encoders["auipc"]([t, hi], {}) + encoders["jalr"]([rd, t, lo], {})
+
+def encode_long_branch(spec, args, options):
+    """
+    Returns a branch to args[2] beyond its range: the negated branch over
+    a jal, or over a far jump if the target is beyond the range of jal as well.
+    """
+    encode_neg = encoders[spec["neg"]]
+    print("Long jump at {}: {} {} {}".format(options["line_num"], spec, args, options), file=sys.stderr)
+    offset = to_int(args[2])
+    current_size = options["current_size"]
+    # (negcond) rs1, rs2, 8
+    # jal zero, label
+    imm = grown_offset(offset, current_size, 2) - 4
+    if current_size <= 2 and fits(imm, 21):
+        return encode_neg([args[0], args[1], 8], {}) + encoders["jal"]([0, imm], {})
+    # (negcond) rs1, rs2, 12
+    # auipc t1, hi
+    # jalr zero, t1, lo
+    return encode_neg([args[0], args[1], 12], {}) + \
+        encode_far_jump(0, grown_offset(offset, current_size, 3) - 4)
+
+# specialized encoders
+################
+# each instruction gets its own encoder, built once at import time.
+# the fixed fields of its spec are pre-OR'd into a base word and
+# the range of its imm is precomputed.
+def imm_to_bit(bitwidth):
+    """
+    Returns a function equivalent to utils.int_to_bit(s, bitwidth).
+    """
+    upper = 1 << (bitwidth-1)
+    mask = (1 << bitwidth) - 1
+    def to_bit(s):
+        s = to_int(s)
+        if -upper <= s < upper:
+            return s & mask
+        else:
+            raise OverflowError
+    return to_bit
+
+imm12_to_bit = imm_to_bit(12)
+imm13_to_bit = imm_to_bit(13)
+imm20_to_bit = imm_to_bit(20)
+imm21_to_bit = imm_to_bit(21)
+
+# rd, rs1, rs2
+def specialize_r(spec):
+    base = spec["opcode"] | (spec["funct3"] << 12) | (spec["funct7"] << 25)
+    if "rs2" in spec:
+        base |= (spec["rs2"] << 20) | spec["rs2"]
+        def encode(args, options):
+            if len(args) != 2:
+                raise IndexError
+            return [
+                base | (register_to_int(args[0]) << 7) | (register_to_int(args[1]) << 15)
+            ]
+    else:
+        def encode(args, options):
+            if len(args) != 3:
+                raise IndexError
+            return [
+                base | (register_to_int(args[0]) << 7) | (register_to_int(args[1]) << 15) | (register_to_int(args[2]) << 20)
+            ]
+    return encode
+
+# rd, rs1, imm
+def specialize_i(spec):
+    # note: funct7 is never applied to i-type (e.g. srai is encoded as srli),
+    # as it has never been.
+    base = spec["opcode"] | (spec["funct3"] << 12)
+    def encode(args, options):
+        if len(args) != 3:
+            raise IndexError
         return [
-            spec["opcode"] | (imm11 << 7) | (imm4to1 << 8) | (spec["funct3"] << 12) | (rs1 << 15) | (rs2 << 20) | (imm10to5 << 25) | (imm12 << 31)
+            base | (register_to_int(args[0]) << 7) | (register_to_int(args[1]) << 15) | (imm12_to_bit(args[2]) << 20)
         ]
-    except OverflowError:
-        print("Long jump at {}: {} {} {}".format(options["line_num"], spec, args, options), file=sys.stderr)
-        # (negcond) rs1, rs2, 8
-        # jal zero, label
-        # ...
-        offset = to_int(args[2])
-        diff = options["current_size"] - 1
-        imm = offset - 4 * diff if offset > 0 else offset - 4
-        negcond_spec = instruction_specs[spec["neg"]]
-        jal_spec = instruction_specs["jal"]
-        return encoder[negcond_spec["type"]](negcond_spec, args[:2] + [8], {}) + \
-            encoder[jal_spec["type"]](jal_spec, ["x0", imm], {})
-        
+    return encode
+
+# rs1, rs2, imm
+def specialize_b(spec):
+    base = spec["opcode"] | (spec["funct3"] << 12)
+    def encode(args, options):
+        if len(args) != 3:
+            raise IndexError
+        try:
+            rs1 = register_to_int(args[0])
+            rs2 = register_to_int(args[1])
+            imm = imm13_to_bit(args[2])
+            if options.get("current_size", 1) > 1:
+                raise OverflowError
+            return [
+                base | (((imm >> 11) & 0b1) << 7) | (((imm >> 1) & 0b1111) << 8) | (rs1 << 15) | (rs2 << 20) | (((imm >> 5) & 0b111111) << 25) | (((imm >> 12) & 0b1) << 31)
+            ]
+        except OverflowError:
+            return encode_long_branch(spec, args, options)
+    return encode
 
 # rs2, rs1, imm
-def encode_s(spec, args, options):
-    if len(args) != 3:
-        raise IndexError    
-    # s* hoge, foo, bar
-    # should be interpreted as
-    # s* rs2, rs1, imm 
-    # (rs1+imm <- rs2)
-    rs2 = register_to_int(args[0])
-    rs1 = register_to_int(args[1])
-    imm = int_to_bit(args[2], 12)
-    imm4to0 = imm & 0b11111
-    imm11to5 = (imm & 0b111111100000) >> 5
-    return [
-        spec["opcode"] | (imm4to0 << 7) | (spec["funct3"] << 12) | (rs1 << 15) | (rs2 << 20) | (imm11to5 << 25)
-    ]
+def specialize_s(spec):
+    base = spec["opcode"] | (spec["funct3"] << 12)
+    def encode(args, options):
+        if len(args) != 3:
+            raise IndexError
+        imm = imm12_to_bit(args[2])
+        return [
+            base | ((imm & 0b11111) << 7) | (register_to_int(args[1]) << 15) | (register_to_int(args[0]) << 20) | ((imm >> 5) << 25)
+        ]
+    return encode
 
 # rd, imm
-# imm will be sll-ed by 12 
-def encode_u(spec, args, options):
-    if len(args) != 2:
-        raise IndexError
-    rd = register_to_int(args[0])
-    imm = int_to_bit(args[1], 20) << 12
-    return [
-        spec["opcode"] | (rd << 7) | (imm & 0xFFFFF000)
-    ]
+def specialize_u(spec):
+    base = spec["opcode"]
+    def encode(args, options):
+        if len(args) != 2:
+            raise IndexError
+        return [
+            base | (register_to_int(args[0]) << 7) | ((imm20_to_bit(args[1]) << 12) & 0xFFFFF000)
+        ]
+    return encode
 
 # rd, imm
-def encode_j(spec, args, options):
-    if len(args) != 2:
-        raise IndexError
-    rd = register_to_int(args[0])
-    imm = int_to_bit(args[1], 21)
-    imm19to12 = (imm &  0b11111111000000000000) >> 12
-    imm11 = (imm & 0b100000000000) >> 11
-    imm10to1 = (imm & 0b11111111110) >> 1
-    imm20 = (imm & (0b1 << 20)) >> 20
-    return [
-        spec["opcode"] | (rd << 7) | (imm19to12 << 12) | (imm11 << 20) | (imm10to1 << 21) | (imm20 << 31)
-    ]
-
-encoder = {
-    "r": encode_r,
-    "i": encode_i,
-    "b": encode_b,
-    "s": encode_s,
-    "u": encode_u,
-    "j": encode_j,
+def specialize_j(spec):
+    base = spec["opcode"]
+    def encode(args, options):
+        if len(args) != 2:
+            raise IndexError
+        try:
+            imm = imm21_to_bit(args[1])
+            if options.get("current_size", 1) > 1:
+                raise OverflowError
+        except OverflowError:
+            return encode_far_jump(register_to_int(args[0]),
+                                   grown_offset(to_int(args[1]), options.get("current_size", 1), 2))
+        return [
+            base | (register_to_int(args[0]) << 7) | (((imm >> 12) & 0b11111111) << 12) | (((imm >> 11) & 0b1) << 20) | (((imm >> 1) & 0b1111111111) << 21) | (((imm >> 20) & 0b1) << 31)
+        ]
+    return encode
+
+specializer = {
+    "r": specialize_r,
+    "i": specialize_i,
+    "b": specialize_b,
+    "s": specialize_s,
+    "u": specialize_u,
+    "j": specialize_j,
 }
+
+def specialize(spec):
+    if "specializer" in spec:
+        return spec["specializer"](spec)
+    else:
+        return specializer[spec["type"]](spec)
+
+encoders = {instr_name: specialize(spec) for instr_name, spec in instruction_specs.items()}
@@ -0,0 +1,53 @@
+def location(filename, line_num):
+    return line_num if filename is None else "{}:{}".format(filename, line_num)
+
+class AsmError(Exception):
+    """
+    Base class of the errors raised while assembling.
+
+    Attributes
+    ----------
+    message : str
+        what went wrong.
+    filename : str or None
+        file name of the source, if known.
+    line_num : int or None
+        line number in the source, if known.
+    """
+    def __init__(self, message, filename=None, line_num=None):
+        super().__init__(message, filename, line_num)
+        self.message = message
+        self.filename = filename
+        self.line_num = line_num
+
+    def __str__(self):
+        return self.message
+
+    def locate(self, filename, line_num):
+        """
+        Set where the error occurred (and add it to the message), unless it is already known.
+        """
+        if self.line_num is None:
+            self.message = "{} at {}".format(self.message, location(filename, line_num))
+            self.filename = filename
+            self.line_num = line_num
+            self.args = (self.message, filename, line_num)
+        return self
+
+class InstructionNotFoundError(AsmError):
+    pass
+
+class InvalidRegisterError(AsmError):
+    pass
+
+class InvalidArgumentsError(AsmError):
+    pass
+
+class ImmediateOverflowError(AsmError):
+    pass
+
+class DuplicateLabelError(AsmError):
+    pass
+
+class InvalidLabelError(AsmError):
+    pass
@@ -0,0 +1,90 @@
+import hashlib
+from .blocks import split_sections, split_blocks, last_line
+
+def read_profile(fname):
+    """
+    Read an execution count profile, and returns label name -> count.
+
+    Each line of a profile is `<label> <count>` (the format of <binary>.symbols,
+    with counts in place of addresses). lines starting with # are ignored,
+    and counts of the same label are summed up.
+    """
+    counts = {}
+    with open(fname) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2 and not fields[0].startswith('#'):
+                counts[fields[0]] = counts.get(fields[0], 0) + int(fields[1])
+    return counts
+
+class BlockLayout:
+    """
+    A pass which moves cold blocks to the end of a source, so that hot blocks sit together.
+
+    Blocks which fall through to each other are kept together, unless one of them
+    is hot and the other is cold. when they are split, `j <label of the next block>`
+    is appended to the first one, which costs a jump only on the cold path.
+    The first block (the entry) stays first, and so does the last block at the end
+    unless it ends with an unconditional jump. .data regions are not reordered;
+    they are put after the text in the order of the source.
+
+    Parameters
+    ----------
+    counts : dict
+        label name -> execution count (see read_profile).
+    cold_threshold : int, optional
+        blocks executed no more than this are cold.
+    """
+    def __init__(self, counts, cold_threshold=0):
+        self.counts = counts
+        self.cold_threshold = cold_threshold
+
+    def key(self):
+        """
+        Returns a digest of the options, which object units depend on.
+        """
+        return hashlib.sha256(repr(('layout', sorted(self.counts.items()), self.cold_threshold)).encode()).digest()
+
+    def count(self, block):
+        return max((self.counts.get(label, 0) for label in block.labels), default=0)
+
+    def __call__(self, source, stats):
+        with stats.phase("layout"):
+            text, data = split_sections(source)
+            blocks = split_blocks(text)
+
+            # chains of blocks which stay in this order. a chain is either hot or cold,
+            # and the first block is hot as the entry.
+            is_hot = [i == 0 or self.count(block) > self.cold_threshold for i, block in enumerate(blocks)]
+            chains = [[0]]
+            for i in range(1, len(blocks)):
+                if blocks[i - 1].falls_through() and is_hot[i - 1] == is_hot[i]:
+                    chains[-1].append(i)
+                else:
+                    chains.append([i])
+
+            # the first chain is kept first since we are entered from there, and so is the
+            # last one if it falls through (to the next unit, if any).
+            pinned = chains[1:][-1:] if blocks[-1].falls_through() else []
+            middle = chains[1:len(chains) - len(pinned)]
+            order = chains[:1] + [chain for chain in middle if is_hot[chain[0]]] + \
+                [chain for chain in middle if not is_hot[chain[0]]] + pinned
+
+            lines = []
+            num_fixups = 0
+            for k, chain in enumerate(order):
+                for i in chain:
+                    lines.extend(blocks[i].lines)
+                last = chain[-1]
+                next_chain = order[k + 1] if k + 1 < len(order) else None
+                if last + 1 < len(blocks) and blocks[last].falls_through() and \
+                   (next_chain is None or next_chain[0] != last + 1):
+                    filename, line_num = last_line(blocks[last])
+                    lines.append((filename, line_num, "j {}".format(blocks[last + 1].labels[0])))
+                    num_fixups += 1
+            lines.extend(data)
+
+        if stats.enabled:
+            stats.count("moved blocks", sum(1 for prev, chain in zip(order, order[1:]) if prev[-1] + 1 != chain[0]))
+            stats.count("fall-through fixups", num_fixups)
+        return lines
@@ -0,0 +1,135 @@
+import struct
+from bisect import bisect_right
+from .utils import new_indices
+
+# layout of a line table
+#
+#   header    : magic, format version, number of files, number of runs (little endian 32-bit words)
+#   filenames : length and utf-8 bytes of each file name (empty for sources without a name)
+#   runs      : pc delta, line delta, file id and length of each run
+#
+# a run is a sequence of instructions at consecutive words and on consecutive lines of a file.
+# only the last instruction of a run may take several words (e.g. li and long jumps).
+# deltas are taken from the first word and line of the previous run, and every integer after
+# the header is a LEB128 varint (line deltas are zigzag encoded).
+MAGIC = 0x4e4c5843 # b'CXLN'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4I')
+
+def put_varint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7f) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def get_varint(data, i):
+    n = 0
+    shift = 0
+    while True:
+        b = data[i]
+        i += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, i
+        shift += 7
+
+def zigzag(n):
+    return (n << 1) if n >= 0 else ((-n << 1) - 1)
+
+def unzigzag(n):
+    return (n >> 1) if n & 1 == 0 else -((n + 1) >> 1)
+
+def build_line_table(line_map):
+    """
+    Returns a line table in binary format.
+
+    Parameters
+    ----------
+    line_map : LineMap
+        map from instructions to source lines (see AsmResult.line_map).
+
+    Returns
+    -------
+    _ : bytes
+        the line table.
+    """
+    runs = []
+    offsets, line_nums, file_ids = line_map.offsets, line_map.line_nums, line_map.file_ids
+    for i in range(len(offsets)):
+        if runs:
+            start, line, file_id, length = runs[-1]
+            if (file_ids[i] == file_id and offsets[i] == start + length
+                and line_nums[i] == line + length):
+                runs[-1][3] += 1
+                continue
+        runs.append([offsets[i], line_nums[i], file_ids[i], 1])
+
+    buf = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, len(line_map.filenames), len(runs)))
+    for filename in line_map.filenames:
+        encoded = (filename or '').encode()
+        put_varint(buf, len(encoded))
+        buf += encoded
+    prev_start, prev_line = 0, 0
+    for start, line, file_id, length in runs:
+        put_varint(buf, start - prev_start)
+        put_varint(buf, zigzag(line - prev_line))
+        put_varint(buf, file_id)
+        put_varint(buf, length)
+        prev_start, prev_line = start, line
+    return bytes(buf)
+
+class LineTable:
+    """
+    A line table in binary format, decoded for lookups.
+
+    Parameters
+    ----------
+    data : bytes-like
+        the line table (see build_line_table).
+    """
+    def __init__(self, data):
+        magic, version, num_files, num_runs = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a line table")
+
+        i = HEADER.size
+        self.filenames = []
+        for _ in range(num_files):
+            length, i = get_varint(data, i)
+            self.filenames.append(bytes(data[i:i + length]).decode() or None)
+            i += length
+
+        self.starts = new_indices()
+        self.lines = new_indices()
+        self.file_ids = new_indices()
+        self.lengths = new_indices()
+        start, line = 0, 0
+        for _ in range(num_runs):
+            delta, i = get_varint(data, i)
+            start += delta
+            delta, i = get_varint(data, i)
+            line += unzigzag(delta)
+            file_id, i = get_varint(data, i)
+            length, i = get_varint(data, i)
+            self.starts.append(start)
+            self.lines.append(line)
+            self.file_ids.append(file_id)
+            self.lengths.append(length)
+
+    @classmethod
+    def read(cls, fname):
+        with open(fname, 'rb') as f:
+            return cls(f.read())
+
+    def find(self, pc):
+        """
+        Returns (filename, line number) of the instruction at a given pc (in bytes),
+        or None if there is no such instruction.
+        """
+        offset = pc >> 2
+        i = bisect_right(self.starts, offset) - 1
+        if i < 0:
+            return None
+        # the last instruction of a run covers the words up to the next run
+        k = min(offset - self.starts[i], self.lengths[i] - 1)
+        return self.filenames[self.file_ids[i]], self.lines[i] + k
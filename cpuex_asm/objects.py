@@ -0,0 +1,108 @@
+import os
+import sys
+import glob
+import pickle
+import hashlib
+from .cache import tables_digest, hash_file, evict_lru, DEFAULT_MAX_SIZE
+from .utils import new_words, new_indices
+
+class ObjectUnit:
+    """
+    A source file assembled on its own, waiting to be linked.
+
+    Attributes
+    ----------
+    words : array of int
+        quick encoded instructions, with a placeholder (a word) for each
+        labelled instruction.
+    labels : dict
+        local symbol table (label name -> offset in the unit).
+    label_names : list of str
+        label id -> label name, for ids in relocations.
+    relocations : list of Instruction
+        labelled instructions.
+    origins : array of int
+        offset of the placeholder of each relocation.
+    sizes : array of int
+        size of each relocation, as far as the unit alone can tell.
+        the linker takes them as lower bounds.
+    filename : str or None
+        file name of the source.
+    line_offsets : array of int
+        offset of each instruction, among the placeholders.
+    line_nums : array of int
+        line number of each instruction.
+    data : array of int
+        words in the .data section.
+    data_labels : dict
+        labels in the .data section (label name -> offset in data).
+    data_relocations : list of (int, Instruction)
+        offset in data and the directive of each word which refers to a label.
+    data_align : int
+        alignment (in words) of the .data section.
+    relaxation_passes : int
+        number of sweeps to fix the sizes of relocations to local labels.
+    """
+    def __init__(self, words, labels, label_names, relocations, origins, sizes,
+                 filename=None, line_offsets=None, line_nums=None,
+                 data=None, data_labels=None, data_relocations=None, data_align=1, relaxation_passes=0):
+        self.words = words
+        self.labels = labels
+        self.label_names = label_names
+        self.relocations = relocations
+        self.origins = origins
+        self.sizes = sizes
+        self.filename = filename
+        self.line_offsets = line_offsets if line_offsets is not None else new_indices()
+        self.line_nums = line_nums if line_nums is not None else new_indices()
+        self.data = data if data is not None else new_words()
+        self.data_labels = data_labels if data_labels is not None else {}
+        self.data_relocations = data_relocations if data_relocations is not None else []
+        self.data_align = data_align
+        self.relaxation_passes = relaxation_passes
+
+class ObjectStore:
+    """
+    On-disk store of object units, keyed by the names and the content of their sources
+    (units refer to their file names, e.g. in line maps and errors).
+
+    Units are pickled, and loading a pickle can run arbitrary code, so the
+    directory must be trusted (writable only by the user). The mtime of a unit
+    is updated on every hit, and the least recently used units are evicted
+    once the store grows beyond max_size bytes.
+    """
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.digest = tables_digest()
+
+    def key(self, filename, salt=b''):
+        h = hashlib.sha256(self.digest + salt)
+        h.update(filename.encode() + b'\0')
+        hash_file(h, filename)
+        return h.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.obj')
+
+    def load(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                unit = pickle.load(f)
+            os.utime(self.path(key))
+            return unit
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def store(self, key, unit):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = '{}.{}.tmp'.format(self.path(key), os.getpid())
+            with open(tmp, 'wb') as f:
+                pickle.dump(unit, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path(key))
+        except OSError as e:
+            print("[-] failed to store an object: {}".format(e), file=sys.stderr)
+
+    def evict(self):
+        evict_lru([[path] for path in glob.glob(os.path.join(self.directory, '*.obj'))], self.max_size)
@@ -0,0 +1,210 @@
+import re
+import sys
+from .instructions import instruction_specs
+from .syntax_sugars import syntax_sugar_specs
+from .registers import register_to_int
+from .encode import encoders, specialize
+from .utils import to_int
+from .constant import STDIO
+from .errors import AsmError, InvalidArgumentsError, location
+
+# patterns are compiled once here, not for each operand
+NUM_RE = re.compile(r'^(-)?(0x)?[0-9A-Fa-f][0-9A-Fa-f]*$')
+LO_RE = re.compile(r"^\%lo\((.*)\)$")
+# <first token> <the rest> ; <comment>
+LINE_RE = re.compile(r'\s*([^\s;]+)([^;]*)')
+
+LABEL = "label"
+INSTR = "instr"
+DIRECTIVE = "directive"
+
+REG = "reg"
+IMM = "imm"
+
+# operands of each instruction type
+OPERAND_KINDS = {
+    "r": (REG, REG, REG),
+    "i": (REG, REG, IMM),
+    "b": (REG, REG, IMM),
+    "s": (REG, REG, IMM),
+    "u": (REG, IMM),
+    "j": (REG, IMM),
+}
+
+class Instruction:
+    """
+    A parsed instruction which refers to a label.
+
+    Attributes
+    ----------
+    name : str
+        mnemonic (interned).
+    args : tuple
+        arguments. registers and numbers are converted to int,
+        and the last one is the label.
+    label : int
+        id of the label it refers to.
+    is_lo : bool
+        True if the label is referred as %lo(label), i.e. by its address.
+        otherwise it is referred by the offset from the instruction.
+    filename : str or None
+        file name of the source.
+    line_num : int
+        line number in the source.
+    """
+    __slots__ = ('name', 'args', 'label', 'is_lo', 'filename', 'line_num')
+
+    def __init__(self, name, args, label, is_lo, filename, line_num):
+        self.name = name
+        self.args = args
+        self.label = label
+        self.is_lo = is_lo
+        self.filename = filename
+        self.line_num = line_num
+
+def is_num(s):
+    return NUM_RE.match(s) is not None
+
+def get_raw_label(label):
+    label_inside = LO_RE.match(label)
+    if label_inside is not None:
+        return label_inside.group(1)
+    else:
+        return label
+
+def get_label_in_args(spec, args):
+    if(spec["type"] in ["b", "i", "s"] \
+       and len(args) == 3 \
+       and not is_num(args[2])):
+        return args[2]
+    elif (spec["type"] in ["j", "u"] \
+          and len(args) == 2 \
+          and not is_num(args[1])):
+        return args[1]
+    elif ('arg_num' in spec \
+          and len(args) == spec['arg_num'] \
+          and not is_num(args[len(args)-1])):
+        return args[len(args)-1]
+    else:
+        return None
+
+def get_operand_kinds(spec):
+    kinds = OPERAND_KINDS[spec["type"]]
+    # syntax sugars omit the leading operands of their base type
+    # (e.g. li rd, imm is addi without rs1, j imm is jal without rd)
+    if 'arg_num' in spec:
+        return kinds[len(kinds) - spec['arg_num']:]
+    return kinds
+
+# mnemonic -> (spec, operand kinds, encoder), built at import time
+mnemonics = {}
+for instr_name, spec in syntax_sugar_specs.items():
+    mnemonics[instr_name] = (spec, get_operand_kinds(spec), specialize(spec))
+for instr_name, spec in instruction_specs.items():
+    mnemonics[instr_name] = (spec, get_operand_kinds(spec), encoders[instr_name])
+
+def get_spec(instr_name):
+    if instr_name in mnemonics:
+        return mnemonics[instr_name][0]
+    else:
+        return None
+
+def get_encoder(instr_name):
+    if instr_name in mnemonics:
+        return mnemonics[instr_name][2]
+    else:
+        return None
+
+def parse_operand(kind, arg):
+    if kind == REG:
+        return register_to_int(arg)
+    elif is_num(arg):
+        return to_int(arg)
+    else:
+        return arg
+
+def parse_line(raw_line):
+    """
+    Parse a line of assembly.
+
+    Parameters
+    ----------
+    raw_line : str
+        a line to be parsed.
+
+    Returns
+    -------
+    _ : tuple or None
+        None for a blank line, (LABEL, name) for a label,
+        (DIRECTIVE, (name, args)) for a directive (e.g. .word), or
+        (INSTR, (instr_name, spec, args, target_label)) for an instruction.
+        registers and numbers in args are converted to int. spec is None
+        if the instruction is not found. InvalidArgumentsError is raised
+        if they cannot be converted.
+    """
+    m = LINE_RE.match(raw_line)
+    if m is None:
+        return None
+    instr_name, rest = m.groups()
+    instr_name = sys.intern(instr_name)
+
+    # note: the rest of the line is ignored after a label.
+    if instr_name.endswith(':'):
+        return (LABEL, instr_name[:-1])
+
+    args = [' '.join(arg.split()) for arg in rest.split(',')]
+    if instr_name.startswith('.'):
+        return (DIRECTIVE, (instr_name, args))
+    if instr_name not in mnemonics:
+        return (INSTR, (instr_name, None, args, None))
+    spec, kinds, _ = mnemonics[instr_name]
+    try:
+        target_label = get_label_in_args(spec, args)
+        # the label is always the last argument and stays as it is.
+        n = len(args) - 1 if target_label is not None else len(args)
+        for i in range(0, min(len(kinds), n)):
+            args[i] = parse_operand(kinds[i], args[i])
+    except (IndexError, ValueError):
+        # e.g. a label which looks like a number (add1), or -0x10
+        raise InvalidArgumentsError("invalid arguments for {}".format(instr_name))
+    return (INSTR, (instr_name, spec, args, target_label))
+
+def parse_or_none(raw_line):
+    """
+    parse_line for passes over sources (e.g. layout.py), which leave
+    invalid lines to be reported when they are assembled.
+    """
+    try:
+        return parse_line(raw_line)
+    except AsmError:
+        return None
+
+# sources
+################
+# a source is an iterable of (filename, line_num, text).
+# lines are read lazily, and their text is dropped as soon as it is parsed.
+def read_lines(f, filename=None):
+    """
+    Yields lines of a file object as a source.
+    """
+    for line_num, text in enumerate(f, 1):
+        yield filename, line_num, text
+
+def read_file(filename):
+    """
+    Yields lines of a file as a source.
+    """
+    with open(filename, 'r') as f:
+        yield from read_lines(f, filename)
+
+STDIN_NAME = "<stdin>"
+
+def read_source(filename):
+    """
+    Yields lines of a file, or of stdin if filename is STDIO, as a source.
+    lines of stdin are parsed as they arrive, so that a compiler can pipe
+    its output while it is still generating the rest.
+    """
+    if filename == STDIO:
+        return read_lines(sys.stdin, STDIN_NAME)
+    return read_file(filename)
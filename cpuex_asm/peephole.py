@@ -0,0 +1,150 @@
+import sys
+import hashlib
+from .constant import CONDITIONAL_JUMP_INSTRS
+from .parser import LABEL, INSTR, DIRECTIVE, parse_line, location
+from .blocks import is_unconditional_jump
+from .errors import AsmError
+
+# utilities for jumps
+def is_jump(instr_name):
+    return instr_name in ("j", "jal", "call", "tail") or instr_name in CONDITIONAL_JUMP_INSTRS
+
+def jump_text(instr_name, args, target):
+    """
+    Returns a jump to another target, in assembly.
+    """
+    return "{} {}".format(instr_name, ", ".join(["x{}".format(r) for r in args[:-1]] + [target]))
+
+class Line:
+    __slots__ = ('filename', 'line_num', 'text', 'label', 'instr_name', 'args', 'target', 'is_directive')
+
+    def __init__(self, filename, line_num, text):
+        self.filename = filename
+        self.line_num = line_num
+        self.text = text
+        self.label = None
+        self.instr_name = None
+        self.args = None
+        self.target = None
+        self.is_directive = False
+        try:
+            parsed_line = parse_line(text)
+        except AsmError:
+            # reported when the line is assembled
+            parsed_line = None
+        if parsed_line is None:
+            return
+        kind, content = parsed_line
+        if kind == LABEL:
+            self.label = content
+        elif kind == DIRECTIVE:
+            # data or a section switch, which is never jumped over or through
+            self.is_directive = True
+        elif kind == INSTR:
+            self.instr_name, spec, self.args, target = content
+            if spec is not None and is_jump(self.instr_name):
+                self.target = target
+
+class JumpThreading:
+    """
+    A pass which threads jump chains and removes jumps to the next instruction.
+
+    A jump (j, jal or a conditional branch) to a label whose first instruction
+    is j/jal zero is redirected to the target of the latter, and a j, jal zero or
+    conditional branch to the next instruction is removed. labels defined in
+    other units are left as they are.
+
+    Parameters
+    ----------
+    verbose : bool, optional
+        print what is changed to stderr.
+    """
+    def __init__(self, verbose=True):
+        self.verbose = verbose
+
+    def key(self):
+        return hashlib.sha256(b'jump threading').digest()
+
+    def report(self, x, message):
+        if self.verbose:
+            print("[*] {}: {}".format(location(x.filename, x.line_num), message), file=sys.stderr)
+
+    def __call__(self, source, stats):
+        with stats.phase("jump threading"):
+            lines = [Line(filename, line_num, text) for filename, line_num, text in source]
+            num_threaded = self.thread(lines)
+            lines, num_removed = self.remove_jumps_to_next(lines)
+
+        if stats.enabled:
+            stats.count("threaded jumps", num_threaded)
+            stats.count("removed jumps", num_removed)
+        return [(x.filename, x.line_num, x.text) for x in lines]
+
+    def thread(self, lines):
+        # label -> the first instruction after it
+        first_instrs = {}
+        pending = []
+        for x in lines:
+            if x.label is not None:
+                pending.append(x.label)
+            elif x.is_directive:
+                # labels of data are not followed by an instruction
+                pending = []
+            elif x.instr_name is not None:
+                for label in pending:
+                    first_instrs[label] = x
+                pending = []
+
+        def forwards_to(label):
+            x = first_instrs.get(label)
+            if x is not None and x.target is not None and is_unconditional_jump(x.instr_name, x.args):
+                return x.target
+            return None
+
+        num_threaded = 0
+        for x in lines:
+            if x.target is None:
+                continue
+            target = x.target
+            visited = {target}
+            while True:
+                next_target = forwards_to(target)
+                if next_target is None or next_target in visited:
+                    break
+                visited.add(next_target)
+                target = next_target
+            if target != x.target:
+                self.report(x, "{} -> {} (threaded)".format(x.target, target))
+                x.text = jump_text(x.instr_name, x.args, target)
+                x.target = target
+                num_threaded += 1
+        return num_threaded
+
+    def remove_jumps_to_next(self, lines):
+        num_removed = 0
+        is_changed = True
+        while is_changed:
+            is_changed = False
+            kept = []
+            # the last instruction if it is a removable jump, and labels after it
+            jump_index, labels = None, set()
+            for x in lines + [None]:
+                if x is not None and x.label is not None:
+                    labels.add(x.label)
+                elif x is not None and x.is_directive:
+                    # a jump over data is not to the next instruction
+                    jump_index, labels = None, set()
+                elif x is None or x.instr_name is not None:
+                    if jump_index is not None and kept[jump_index].target in labels:
+                        jump = kept.pop(jump_index)
+                        self.report(jump, "removed a jump to the next instruction ({})".format(jump.target))
+                        num_removed += 1
+                        is_changed = True
+                    if x is None:
+                        break
+                    removable = x.target is not None and (x.instr_name in CONDITIONAL_JUMP_INSTRS or
+                                                          is_unconditional_jump(x.instr_name, x.args))
+                    jump_index, labels = (len(kept) if removable else None), set()
+                kept.append(x)
+            lines = kept
+        return lines, num_removed
@@ -1,3 +1,5 @@
+from .errors import InvalidRegisterError
+
 register_aliases = {
     # integer
     'zero': 0,
@@ -74,10 +76,11 @@ register_aliases = {
 }
 
 def register_to_int(s):
+    if isinstance(s, int):
+        return s
     if s in register_aliases:
         return register_aliases[s]
-    elif s.startswith('x') or s.startswith('f'):
+    elif (s.startswith('x') or s.startswith('f')) and s[1:].isdigit():
         return int(s[1:])
     else:
-        print("[-] Invalid register name: {}".format(s))
-        exit(1)
+        raise InvalidRegisterError("Invalid register name: {}".format(s))
@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from .utils import new_words, new_indices
+
+class OffsetIndex:
+    """
+    Fenwick tree over the growth of labelled instructions.
+
+    Every labelled instruction starts with the size it got from the quick
+    encoding (its "origin" is the word offset it had back then). When one of
+    them grows, everything placed after it moves by the same amount, so the
+    current offset of any word is its origin plus the total growth of the
+    labelled instructions placed before it.
+    """
+    def __init__(self, origins):
+        self.origins = origins
+        self.tree = [0] * (len(origins) + 1)
+
+    def grow(self, i, diff):
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += diff
+            i += i & -i
+
+    def growth_before(self, k):
+        total = 0
+        while k > 0:
+            total += self.tree[k]
+            k -= k & -k
+        return total
+
+    def resolve(self, origin):
+        return origin + self.growth_before(bisect_left(self.origins, origin))
+
+def relax(labelled_instructions, origins, sizes, targets, label_offsets, encode, fixed=None):
+    """
+    Fix the size of each labelled instruction.
+
+    Parameters
+    ----------
+    labelled_instructions : list of Instruction
+        instructions with label references, in program order.
+    origins : array of int
+        offset of the placeholder (a word) of each labelled instruction.
+    sizes : array of int
+        size of each labelled instruction. they are taken as lower bounds,
+        and updated in place.
+    targets : array of int
+        label id referred by each labelled instruction.
+    label_offsets : array of int
+        label id -> offset among the placeholders.
+    encode : callable
+        encode(instruction, offset, size, target_offset) -> list of int.
+    fixed : set of int, optional
+        label ids whose offsets are absolute, i.e. not moved by the growth
+        of the instructions (e.g. labels in a separate data segment).
+
+    Returns
+    -------
+    _ : (list of list of int, list of int, int)
+        final machine codes of each labelled instruction,
+        label id -> final offset, and the number of sweeps.
+    """
+    index = OffsetIndex(origins)
+    for i in range(0, len(sizes)):
+        if sizes[i] > 1:
+            index.grow(i, sizes[i] - 1)
+
+    if fixed:
+        def resolve_label(label_id):
+            offset = label_offsets[label_id]
+            return offset if label_id in fixed else index.resolve(offset)
+    else:
+        def resolve_label(label_id):
+            return index.resolve(label_offsets[label_id])
+
+    # here we assume that the bigger the imm is, the more space is used.
+    # instructions only grow, so sweeping them in order until nothing changes
+    # converges to the same sizes as re-encoding the whole program,
+    # as long as we start from sizes no bigger than the final ones.
+    is_size_changed = True
+    passes = 0
+    while is_size_changed:
+        is_size_changed = False
+        passes += 1
+        patches = []
+        for i, x in enumerate(labelled_instructions):
+            imm_patches = encode(x,
+                                 index.resolve(origins[i]),
+                                 sizes[i],
+                                 resolve_label(targets[i]))
+            if len(imm_patches) > sizes[i]:
+                index.grow(i, len(imm_patches) - sizes[i])
+                sizes[i] = len(imm_patches)
+                is_size_changed = True
+            patches.append(imm_patches)
+
+    return patches, [resolve_label(label_id) for label_id in range(0, len(label_offsets))], passes
+
+def rebuild(instructions, origins, sizes, patches):
+    """
+    Patch every labelled instruction into the instruction array.
+
+    Parameters
+    ----------
+    instructions : array of int
+        quick encoded instructions, with a placeholder for each labelled one.
+    origins : array of int
+        offset of each placeholder in `instructions`.
+    sizes : array of int
+        final size of each labelled instruction.
+    patches : list of list of int
+        final machine codes of each labelled instruction.
+
+    Returns
+    -------
+    _ : array of int
+        the instructions with every labelled instruction patched in.
+        this is `instructions` itself if no labelled instruction has grown.
+    """
+    size = len(instructions) + sum(sizes) - len(sizes)
+    if size == len(instructions):
+        for origin, imm_patches in zip(origins, patches):
+            instructions[origin] = imm_patches[0]
+        return instructions
+
+    # copy runs of quick encoded instructions between the placeholders
+    # into a preallocated array, and patch the rest in place.
+    result = new_words(size)
+    with memoryview(instructions) as src, memoryview(result) as dst:
+        prev = 0
+        pos = 0
+        for origin, current_size, imm_patches in zip(origins, sizes, patches):
+            dst[pos:pos + origin - prev] = src[prev:origin]
+            pos += origin - prev
+            for j in range(0, len(imm_patches)):
+                result[pos + j] = imm_patches[j]
+            pos += current_size
+            prev = origin + 1
+        dst[pos:] = src[prev:]
+    return result
+
+def shift(offsets, origins, sizes):
+    """
+    Returns final offsets of words, given their offsets among the placeholders.
+
+    Parameters
+    ----------
+    offsets : iterable of int
+        offsets among the placeholders, in ascending order.
+    origins : array of int
+        offset of the placeholder of each labelled instruction.
+    sizes : array of int
+        final size of each labelled instruction.
+    """
+    result = new_indices()
+    growth = 0
+    j = 0
+    for offset in offsets:
+        while j < len(origins) and origins[j] < offset:
+            growth += sizes[j] - 1
+            j += 1
+        result.append(offset + growth)
+    return result
@@ -0,0 +1,104 @@
+from bisect import bisect_right
+from .utils import write_words, words_to_bytes
+from .symbols import build_symbol_table
+from .linetable import build_line_table
+
+class LineMap:
+    """
+    Map from instructions in a binary to the source lines they came from.
+
+    Attributes
+    ----------
+    offsets : array of int
+        offset (in words) of the first word of each instruction, in ascending order.
+    line_nums : array of int
+        line number of each instruction.
+    file_ids : array of int
+        index in filenames of each instruction.
+    filenames : list of str or None
+        file names of the sources.
+    """
+    def __init__(self, offsets, line_nums, file_ids, filenames):
+        self.offsets = offsets
+        self.line_nums = line_nums
+        self.file_ids = file_ids
+        self.filenames = filenames
+
+    def find(self, offset):
+        """
+        Returns (filename, line number) of the instruction at a given offset (in words),
+        or None if there is no such instruction.
+        """
+        i = bisect_right(self.offsets, offset) - 1
+        if i < 0:
+            return None
+        return self.filenames[self.file_ids[i]], self.line_nums[i]
+
+class AsmResult:
+    """
+    Result of an assembly.
+
+    Attributes
+    ----------
+    words : array of int
+        rv32im machine codes as an array of 32-bit words.
+    labels : dict
+        label name -> offset (in words).
+    line_map : LineMap
+        map from instructions to source lines. it is built on first access.
+    relaxation_passes : int
+        number of sweeps over the labelled instructions until their sizes were fixed,
+        in each object unit (local labels) and in the linker.
+    stats : Stats or None
+        metrics of the assembly, if it was instrumented (see stats).
+    data : array of int or None
+        words of the .data sections, if they were placed in a separate segment.
+        otherwise they follow the instructions in `words`.
+    data_base : int or None
+        address (in bytes) of the separate data segment.
+    """
+    def __init__(self, words, labels, build_line_map, relaxation_passes=0, stats=None, data=None, data_base=None):
+        self.words = words
+        self.labels = labels
+        self.data = data
+        self.data_base = data_base
+        self.relaxation_passes = relaxation_passes
+        self.stats = stats
+        self.build_line_map = build_line_map
+        self._line_map = None
+
+    @property
+    def line_map(self):
+        if self._line_map is None:
+            self._line_map = self.build_line_map()
+        return self._line_map
+
+    def symbols(self):
+        """
+        Returns the symbol table in the format of <output>.symbols.
+        """
+        return '\n'.join(map(lambda x: '{} {}'.format(x[0], str(4 * x[1])), self.labels.items()))
+
+    def symbol_table(self):
+        """
+        Returns the symbol table in binary format (see symbols.SymbolIndex).
+        """
+        return build_symbol_table(self.labels)
+
+    def line_table(self):
+        """
+        Returns the line map in binary format (see linetable.LineTable).
+        """
+        return build_line_table(self.line_map)
+
+    def tobytes(self):
+        """
+        Returns the machine codes in binary format (little endian).
+        """
+        return words_to_bytes(self.words)
+
+    def write(self, f):
+        """
+        Write the machine codes to a binary file object.
+        """
+        write_words(f, self.words)
@@ -0,0 +1,84 @@
+import io
+import os
+import sys
+import socketserver
+from .client import FORWARDED_ENV, is_private_directory, send, receive, code_digest
+# the entry point used to be here
+from .client import main
+
+class Handler(socketserver.BaseRequestHandler):
+    """
+    Runs an assembly requested by a client, in a forked process.
+
+    A request is {"digest", "cwd", "env", "argv"}, and the reply is
+    {"code", "stdout", "stderr"}. Outputs are written by the server,
+    to the paths given by the client (relative to its cwd). requests from
+    another version of the code (see client.code_digest) are declined.
+    """
+    def handle(self):
+        from .asm import main
+        try:
+            request = receive(self.request)
+        except ValueError:
+            return
+        if request.get("digest") != self.server.digest:
+            send(self.request, {"code": None})
+            return
+
+        os.chdir(request["cwd"])
+        # variables not set by the client must not be inherited from the server
+        for name in FORWARDED_ENV:
+            if name in request["env"]:
+                os.environ[name] = request["env"][name]
+            else:
+                os.environ.pop(name, None)
+        sys.argv = ['cpuex_asm'] + request["argv"]
+        stdout, stderr = io.StringIO(), io.StringIO()
+        sys.stdout, sys.stderr = stdout, stderr
+        code = 0
+        try:
+            main(request["argv"])
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            print("[-] {}: {}".format(type(e).__name__, e), file=stderr)
+            code = 1
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        send(self.request, {"code": code, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()})
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    # summary of the code being served (see client.code_digest)
+    digest = None
+
+def serve(path):
+    """
+    Serve assemblies on a UNIX socket until interrupted.
+
+    Tables are built once here, and each request is handled in a forked
+    process, so that concurrent clients (e.g. make -j) do not wait for each other.
+    The socket is only accessible to this user.
+    """
+    # build the tables before forking
+    from . import asm
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not is_private_directory(directory):
+        raise PermissionError("others can replace the socket in {}".format(directory))
+    if os.path.exists(path):
+        os.remove(path)
+    # created with 0600 by bind, so that no one else can connect in the meantime
+    umask = os.umask(0o177)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(umask)
+    server.digest = code_digest()
+    with server:
+        print("[+] listening on {}".format(path), file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(path)
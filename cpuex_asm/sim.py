@@ -0,0 +1,642 @@
+import re
+import sys
+import math
+import time
+import struct
+import argparse
+import itertools
+from array import array
+from .disasm import instruction_tables, imm_i, imm_s, imm_b, imm_j, MASK_OPCODE, MASK_FUNCT3, MASK_FUNCT7
+from .bin2coe import open_image
+from .symbols import read_symbols
+
+MASK = 0xFFFFFFFF
+SIGN = 0x80000000
+
+# uart (axi uart lite) mapped to memory
+UART_BASE = 0x7F000000
+UART_RX = 0x0
+UART_TX = 0x4
+UART_STAT = 0x8
+UART_END = UART_BASE + 0x10
+STAT_RX_VALID = 0b0001
+STAT_TX_EMPTY = 0b0100
+
+DEFAULT_MEMORY_SIZE = 1 << 22
+
+# whether words in memory can be accessed as native unsigned ints
+NATIVE_WORDS = sys.byteorder == 'little' and struct.calcsize('I') == 4
+
+class SimError(Exception):
+    """
+    Raised when a program cannot be executed any further.
+
+    Attributes
+    ----------
+    pc : int
+        address (in bytes) of the instruction.
+    """
+    def __init__(self, message, pc):
+        super().__init__(message, pc)
+        self.message = message
+        self.pc = pc
+
+    def __str__(self):
+        return "{} at pc {}".format(self.message, self.pc)
+
+# utilities for values
+def signed(value):
+    return value - ((value & SIGN) << 1)
+
+float_buf = array('f', [0.0])
+bits_buf = memoryview(float_buf).cast('B').cast('I')
+
+def to_float(bits):
+    bits_buf[0] = bits
+    return float_buf[0]
+
+def to_bits(value):
+    # rounded to single precision (overflows to inf)
+    float_buf[0] = value
+    return bits_buf[0]
+
+class Uart:
+    """
+    A uart which receives given bytes, and keeps transmitted ones.
+    """
+    def __init__(self, received=b''):
+        self.received = bytes(received)
+        self.pos = 0
+        self.transmitted = bytearray()
+
+    def load(self, offset):
+        if offset == UART_RX:
+            if self.pos < len(self.received):
+                self.pos += 1
+                return self.received[self.pos - 1]
+            return 0
+        if offset == UART_STAT:
+            return STAT_TX_EMPTY | (STAT_RX_VALID if self.pos < len(self.received) else 0)
+        return 0
+
+    def store(self, offset, value):
+        if offset == UART_TX:
+            self.transmitted.append(value & 0xFF)
+
+# operations of integer instructions (the second operand is rs2 or imm)
+def div(a, b):
+    if b == 0:
+        return MASK
+    a, b = signed(a), signed(b)
+    q = abs(a) // abs(b)
+    return (q if (a < 0) == (b < 0) else -q) & MASK
+
+def rem(a, b):
+    if b == 0:
+        return a
+    a, b = signed(a), signed(b)
+    r = abs(a) % abs(b)
+    return (r if a >= 0 else -r) & MASK
+
+# expressions of a and b, compiled into the closures (see compile_maker).
+# (a ^ SIGN) - SIGN is a as a signed value, and (a ^ SIGN) < (b ^ SIGN) compares them as signed ones.
+alu_ops = {
+    "add": "(a + b) & MASK",
+    "sub": "(a - b) & MASK",
+    "sll": "(a << (b & 31)) & MASK",
+    "slt": "int((a ^ SIGN) < (b ^ SIGN))",
+    "sltu": "int(a < b)",
+    "xor": "a ^ b",
+    "srl": "a >> (b & 31)",
+    "sra": "(((a ^ SIGN) - SIGN) >> (b & 31)) & MASK",
+    "or": "a | b",
+    "and": "a & b",
+    "mul": "(a * b) & MASK",
+    "mulh": "((((a ^ SIGN) - SIGN) * ((b ^ SIGN) - SIGN)) >> 32) & MASK",
+    "mulhsu": "((((a ^ SIGN) - SIGN) * b) >> 32) & MASK",
+    "mulhu": "(a * b) >> 32",
+    "div": "div(a, b)",
+    "divu": "a // b if b != 0 else MASK",
+    "rem": "rem(a, b)",
+    "remu": "a % b if b != 0 else a",
+}
+
+alu_imm_ops = {
+    "addi": "add",
+    "sltii": "slt",
+    "sltiu": "sltu",
+    "xori": "xor",
+    "ori": "or",
+    "andi": "and",
+    "slli": "sll",
+    "srli": "srl",
+    "srai": "sra",
+}
+
+branch_conds = {
+    "beq": "a == b",
+    "bne": "a != b",
+    "blt": "(a ^ SIGN) < (b ^ SIGN)",
+    "bge": "(a ^ SIGN) >= (b ^ SIGN)",
+    "bltu": "a < b",
+    "bgeu": "a >= b",
+}
+
+# name -> (struct of the size, sign bit or 0 if unsigned)
+load_formats = {
+    "lb": (struct.Struct('<B'), 0x80),
+    "lh": (struct.Struct('<H'), 0x8000),
+    "lw": (struct.Struct('<I'), 0),
+    "lbu": (struct.Struct('<B'), 0),
+    "lhu": (struct.Struct('<H'), 0),
+}
+
+store_formats = {
+    "sb": struct.Struct('<B'),
+    "sh": struct.Struct('<H'),
+    "sw": struct.Struct('<I'),
+}
+
+# operations of floating point instructions, on python floats
+def fdiv(a, b):
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+float_ops = {
+    "fadd": lambda a, b: a + b,
+    "fsub": lambda a, b: a - b,
+    "fmul": lambda a, b: a * b,
+    "fdiv": fdiv,
+}
+
+def fcvtws(a):
+    # rounded to the nearest, ties to even (rm = 000)
+    if a != a or a >= 2.0 ** 31:
+        return 0x7FFFFFFF
+    if a < -2.0 ** 31:
+        return SIGN
+    return round(a) & MASK
+
+# float register (bits) -> integer register
+float_to_int_ops = {
+    "fcvtws": lambda a: fcvtws(to_float(a)),
+    "fmvxw": lambda a: a,
+}
+
+float_compare_ops = {
+    "feq": lambda a, b: int(to_float(a) == to_float(b)),
+    "fle": lambda a, b: int(to_float(a) <= to_float(b)),
+}
+
+# operations on bits of float registers
+float_bits_ops = {
+    "fsgnj": lambda a, b: (a & ~SIGN) | (b & SIGN),
+    "fsgnjn": lambda a, b: (a & ~SIGN) | (~b & SIGN),
+    "fsgnjx": lambda a, b: a ^ (b & SIGN),
+    "fsqrt": lambda a, b: to_bits(math.sqrt(to_float(a))) if not to_float(a) < 0 else to_bits(math.nan),
+}
+
+# integer register -> float register (bits)
+int_to_float_ops = {
+    "fcvtsw": lambda a: to_bits(float(signed(a))),
+    "fmvwx": lambda a: a,
+}
+
+# each maker takes the machine, the offset (in words) and the word of an instruction,
+# and returns a closure which executes it and returns the offset of the next one.
+def rd_of(word):
+    return (word >> 7) & 31
+
+def rs1_of(word):
+    return (word >> 15) & 31
+
+def rs2_of(word):
+    return (word >> 20) & 31
+
+def make_nop(m, pc, word):
+    next_pc = pc + 1
+    return lambda: next_pc
+
+def compile_maker(source, **names):
+    """
+    Returns a maker defined in given source, so that an operation is inlined in
+    its closure rather than called (calls dominate the time of each step).
+    """
+    namespace = dict(globals(), **names)
+    exec(source, namespace)
+    return namespace["make"]
+
+alu_template = '''
+def make(m, pc, word):
+    x, rd, rs1, rs2, next_pc = m.x, rd_of(word), rs1_of(word), rs2_of(word), pc + 1
+    if rd == 0:
+        return make_nop(m, pc, word)
+    def step():
+        x[rd] = {}
+        return next_pc
+    return step
+'''
+
+alu_imm_template = '''
+def make(m, pc, word):
+    x, rd, rs1, imm, next_pc = m.x, rd_of(word), rs1_of(word), imm_i(word) & MASK, pc + 1
+    if rd == 0:
+        return make_nop(m, pc, word)
+    def step():
+        x[rd] = {}
+        return next_pc
+    return step
+'''
+
+def substitute(expr, a, b):
+    return re.sub(r'\b[ab]\b', lambda x: a if x.group(0) == 'a' else b, expr)
+
+def alu_maker(op):
+    return compile_maker(alu_template.format(substitute(op, "x[rs1]", "x[rs2]")))
+
+def alu_imm_maker(op):
+    return compile_maker(alu_imm_template.format(substitute(op, "x[rs1]", "imm")))
+
+def make_lui(m, pc, word):
+    x, rd, value, next_pc = m.x, rd_of(word), word & 0xFFFFF000, pc + 1
+    if rd == 0:
+        return make_nop(m, pc, word)
+    def step():
+        x[rd] = value
+        return next_pc
+    return step
+
+def make_auipc(m, pc, word):
+    x, rd, value, next_pc = m.x, rd_of(word), (4 * pc + (word & 0xFFFFF000)) & MASK, pc + 1
+    if rd == 0:
+        return make_nop(m, pc, word)
+    def step():
+        x[rd] = value
+        return next_pc
+    return step
+
+def jump_target(m, pc, offset):
+    # jumps out of the program halt it
+    target = pc + offset // 4
+    return target if 0 <= target < m.code_size else m.code_size
+
+def make_jal(m, pc, word):
+    x, rd, target, link = m.x, rd_of(word), jump_target(m, pc, imm_j(word)), 4 * (pc + 1)
+    if rd == 0:
+        return lambda: target
+    def step():
+        x[rd] = link
+        return target
+    return step
+
+def make_jalr(m, pc, word):
+    x, rd, rs1, imm, link = m.x, rd_of(word), rs1_of(word), imm_i(word), 4 * (pc + 1)
+    if rd == 0:
+        def step():
+            return ((x[rs1] + imm) & MASK) >> 2
+    else:
+        def step():
+            target = ((x[rs1] + imm) & MASK) >> 2
+            x[rd] = link
+            return target
+    return step
+
+branch_template = '''
+def make(m, pc, word):
+    x, rs1, rs2, target, next_pc = m.x, rs1_of(word), rs2_of(word), jump_target(m, pc, imm_b(word)), pc + 1
+    def step():
+        return target if {} else next_pc
+    return step
+'''
+
+def branch_maker(cond):
+    return compile_maker(branch_template.format(substitute(cond, "x[rs1]", "x[rs2]")))
+
+# aligned words are accessed through a view of the memory as words (see Machine.words),
+# which is much faster than struct. the others (and the uart) take the slow path.
+def load_maker(fmt, sign, is_float=False):
+    unpack_from = fmt.unpack_from
+    is_word = fmt.size == 4 and NATIVE_WORDS
+    def make(m, pc, word):
+        x, memory, words, mask, uart = m.x, m.memory, m.words, m.mask, m.uart
+        regs = m.f if is_float else x
+        rd, rs1, imm, next_pc = rd_of(word), rs1_of(word), imm_i(word), pc + 1
+        if rd == 0 and not is_float:
+            # still read, since reading the uart has a side effect
+            regs = [0] * 32
+        def load(addr):
+            if UART_BASE <= addr < UART_END:
+                value = uart.load(addr - UART_BASE)
+            else:
+                value = unpack_from(memory, addr & mask)[0]
+            return (value - ((value & sign) << 1)) & MASK if sign else value
+        if is_word:
+            def step():
+                addr = (x[rs1] + imm) & MASK
+                regs[rd] = load(addr) if addr & 3 or addr >= UART_BASE else words[(addr & mask) >> 2]
+                return next_pc
+        else:
+            def step():
+                regs[rd] = load((x[rs1] + imm) & MASK)
+                return next_pc
+        return step
+    return make
+
+def store_maker(fmt, is_float=False):
+    pack_into = fmt.pack_into
+    value_mask = (1 << (8 * fmt.size)) - 1
+    is_word = fmt.size == 4 and NATIVE_WORDS
+    def make(m, pc, word):
+        x, memory, words, mask, uart = m.x, m.memory, m.words, m.mask, m.uart
+        regs = m.f if is_float else x
+        rs1, rs2, imm, next_pc = rs1_of(word), rs2_of(word), imm_s(word), pc + 1
+        def store(addr, value):
+            if UART_BASE <= addr < UART_END:
+                uart.store(addr - UART_BASE, value)
+            else:
+                pack_into(memory, addr & mask, value & value_mask)
+        if is_word:
+            def step():
+                addr = (x[rs1] + imm) & MASK
+                if addr & 3 or addr >= UART_BASE:
+                    store(addr, regs[rs2])
+                else:
+                    words[(addr & mask) >> 2] = regs[rs2]
+                return next_pc
+        else:
+            def step():
+                store((x[rs1] + imm) & MASK, regs[rs2])
+                return next_pc
+        return step
+    return make
+
+def float_maker(op):
+    def make(m, pc, word):
+        f, rd, rs1, rs2, next_pc = m.f, rd_of(word), rs1_of(word), rs2_of(word), pc + 1
+        def step():
+            f[rd] = to_bits(op(to_float(f[rs1]), to_float(f[rs2])))
+            return next_pc
+        return step
+    return make
+
+def float_bits_maker(op):
+    def make(m, pc, word):
+        f, rd, rs1, rs2, next_pc = m.f, rd_of(word), rs1_of(word), rs2_of(word), pc + 1
+        def step():
+            f[rd] = op(f[rs1], f[rs2])
+            return next_pc
+        return step
+    return make
+
+def float_to_int_maker(op):
+    def make(m, pc, word):
+        x, f, rd, rs1, next_pc = m.x, m.f, rd_of(word), rs1_of(word), pc + 1
+        if rd == 0:
+            return make_nop(m, pc, word)
+        def step():
+            x[rd] = op(f[rs1])
+            return next_pc
+        return step
+    return make
+
+def float_compare_maker(op):
+    def make(m, pc, word):
+        x, f, rd, rs1, rs2, next_pc = m.x, m.f, rd_of(word), rs1_of(word), rs2_of(word), pc + 1
+        if rd == 0:
+            return make_nop(m, pc, word)
+        def step():
+            x[rd] = op(f[rs1], f[rs2])
+            return next_pc
+        return step
+    return make
+
+def int_to_float_maker(op):
+    def make(m, pc, word):
+        x, f, rd, rs1, next_pc = m.x, m.f, rd_of(word), rs1_of(word), pc + 1
+        def step():
+            f[rd] = op(x[rs1])
+            return next_pc
+        return step
+    return make
+
+# instruction name -> maker
+makers = {
+    "lui": make_lui,
+    "auipc": make_auipc,
+    "jal": make_jal,
+    "jalr": make_jalr,
+    "flw": load_maker(struct.Struct('<I'), 0, is_float=True),
+    "fsw": store_maker(struct.Struct('<I'), is_float=True),
+}
+makers.update((name, alu_maker(op)) for name, op in alu_ops.items())
+makers.update((name, alu_imm_maker(alu_ops[op])) for name, op in alu_imm_ops.items())
+makers.update((name, branch_maker(cond)) for name, cond in branch_conds.items())
+makers.update((name, load_maker(fmt, sign)) for name, (fmt, sign) in load_formats.items())
+makers.update((name, store_maker(fmt)) for name, fmt in store_formats.items())
+makers.update((name, float_maker(op)) for name, op in float_ops.items())
+makers.update((name, float_bits_maker(op)) for name, op in float_bits_ops.items())
+makers.update((name, float_to_int_maker(op)) for name, op in float_to_int_ops.items())
+makers.update((name, float_compare_maker(op)) for name, op in float_compare_ops.items())
+makers.update((name, int_to_float_maker(op)) for name, op in int_to_float_ops.items())
+
+def make_illegal(m, pc, word):
+    def step():
+        raise SimError("illegal instruction 0x{:08x}".format(word), 4 * pc)
+    return step
+
+# masked word -> (name, maker), built from instruction_specs so that it follows the assembler
+by_funct7, by_funct3, by_opcode = instruction_tables(lambda instr_name, spec: (instr_name, makers[instr_name]))
+ILLEGAL = (None, make_illegal)
+
+def lookup(word):
+    return by_funct7.get(word & MASK_FUNCT7) or by_funct3.get(word & MASK_FUNCT3) or \
+        by_opcode.get(word & MASK_OPCODE) or ILLEGAL
+
+class Machine:
+    """
+    A rv32im+f machine, with its program predecoded into closures.
+
+    The image is loaded at address 0 of the memory as well, so that data in it
+    can be read (instructions are executed as predecoded, even if they are overwritten).
+    Every register is 0 at first, except ra, which points to the end of the image:
+    the program halts when it jumps out of the image, or returns from there.
+    Addresses wrap around the memory, except the uart at UART_BASE.
+
+    Parameters
+    ----------
+    image : bytes-like
+        little endian words.
+    received : bytes, optional
+        bytes to be received by the uart.
+    memory_size : int, optional
+        size of the memory in bytes (a power of 2).
+    data : bytes-like, optional
+        a data segment to be loaded at data_base (see asm --data-base).
+    data_base : int, optional
+        address of the data segment.
+
+    Attributes
+    ----------
+    x : list of int
+        integer registers, as unsigned 32-bit values.
+    f : list of int
+        floating point registers, as bits.
+    uart : Uart
+        the uart. transmitted bytes are kept in `uart.transmitted`.
+    names : list of str or None
+        instruction name of each word, or None if it is not an instruction.
+    count : int
+        number of instructions executed so far.
+    """
+    def __init__(self, image, received=b'', memory_size=DEFAULT_MEMORY_SIZE, data=None, data_base=0):
+        if memory_size < 4 or memory_size & (memory_size - 1):
+            raise ValueError("memory size must be a power of 2 (at least 4): {}".format(memory_size))
+        self.x = [0] * 32
+        self.f = [0] * 32
+        self.memory = bytearray(memory_size)
+        self.mask = memory_size - 1
+        self.words = memoryview(self.memory).cast('I')
+        self.uart = Uart(received)
+        self.load(0, image)
+        if data is not None:
+            self.load(data_base, data)
+
+        with memoryview(image) as view:
+            words = array('I', bytes(view[:len(view) - len(view) % 4]))
+        if sys.byteorder == 'big':
+            words.byteswap()
+        self.code_size = len(words)
+        self.names = []
+        self.code = []
+        for pc, word in enumerate(words):
+            name, make = lookup(word)
+            self.names.append(name)
+            self.code.append(make(self, pc, word))
+        self.pc = 0
+        self.x[1] = 4 * self.code_size
+        self.count = 0
+
+    def load(self, addr, content):
+        if addr + len(content) > len(self.memory):
+            raise ValueError("memory is too small for {} bytes at {}".format(len(content), addr))
+        self.memory[addr:addr + len(content)] = content
+
+    def run(self, max_steps=None, hits=None):
+        """
+        Run the program until it halts.
+
+        Parameters
+        ----------
+        max_steps : int, optional
+            raise SimError after executing this many instructions.
+        hits : list of int, optional
+            execution count of each instruction, incremented in place.
+            it must be as long as the program (see new_hits).
+
+        Returns
+        -------
+        _ : int
+            number of instructions executed.
+        """
+        code = self.code
+        pc = self.pc
+        steps = itertools.count() if max_steps is None else range(max_steps)
+        count = 0
+        try:
+            if hits is None:
+                for count in steps:
+                    pc = code[pc]()
+            else:
+                for count in steps:
+                    hits[pc] += 1
+                    pc = code[pc]()
+            count = max_steps
+            raise SimError("exceeded {} steps".format(max_steps), 4 * pc)
+        except IndexError as e:
+            if pc < len(code):
+                raise SimError("invalid memory access", 4 * pc) from e
+        except struct.error as e:
+            raise SimError("invalid memory access", 4 * pc) from e
+        finally:
+            self.pc = pc
+            self.count += count
+        return count
+
+    def new_hits(self):
+        return [0] * len(self.code)
+
+# utilities for reports
+def instruction_mix(names, hits):
+    """
+    Returns instruction name -> execution count, in descending order of the counts.
+    """
+    counts = {}
+    for name, hit in zip(names, hits):
+        if hit:
+            counts[name] = counts.get(name, 0) + hit
+    return dict(sorted(counts.items(), key=lambda x: -x[1]))
+
+def label_counts(labels, hits):
+    """
+    Returns label name -> execution count of the instruction at the label
+    (a profile for asm --profile).
+    """
+    return {label: hits[offset] if 0 <= offset < len(hits) else 0 for label, offset in labels.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description='rv32im+f simulator. prints a0 (as a signed integer) when it halts.')
+    parser.add_argument('binary', help='binary to be executed')
+    parser.add_argument('-i', '--input', help='file to be received by the uart')
+    parser.add_argument('-o', '--output', help='file to write bytes transmitted by the uart to')
+    parser.add_argument('--data-base', type=lambda x: int(x, 0), metavar='ADDR',
+                        help='load <binary>.data at this address (see cpuex_asm --data-base)')
+    parser.add_argument('--memory-size', type=lambda x: int(x, 0), default=DEFAULT_MEMORY_SIZE,
+                        help='size of the memory in bytes (default: %(default)s)')
+    parser.add_argument('--max-steps', type=int, help='give up after executing this many instructions')
+    parser.add_argument('--stats', action='store_true',
+                        help='print the number of executed instructions, the speed and the instruction mix to stderr')
+    parser.add_argument('--profile', help='write execution counts of labels in <binary>.symbols to this file '
+                        '(for cpuex_asm --profile)')
+    args = parser.parse_args()
+
+    received = b''
+    if args.input is not None:
+        with open(args.input, 'rb') as f:
+            received = f.read()
+    data = None
+    if args.data_base is not None:
+        with open(args.binary + '.data', 'rb') as f:
+            data = f.read()
+    with open_image(args.binary) as content:
+        m = Machine(content, received, args.memory_size, data, args.data_base or 0)
+    hits = m.new_hits() if args.stats or args.profile is not None else None
+
+    start = time.perf_counter()
+    try:
+        m.run(args.max_steps, hits)
+    except SimError as e:
+        print("[-] {}".format(e), file=sys.stderr)
+        sys.exit(1)
+    finally:
+        elapsed = time.perf_counter() - start
+        if args.output is not None:
+            with open(args.output, 'wb') as f:
+                f.write(m.uart.transmitted)
+        if args.stats:
+            print("[*] {} instructions in {:.3f} s ({:.2f} MIPS)".format(m.count, elapsed,
+                                                                       m.count / elapsed / 1e6 if elapsed else 0),
+                  file=sys.stderr)
+            for name, count in instruction_mix(m.names, hits).items():
+                print("    {:<8} {}".format(name or "illegal", count), file=sys.stderr)
+        if args.profile is not None:
+            with open(args.profile, 'w') as f:
+                for label, count in label_counts(read_symbols(args.binary + '.symbols'), hits).items():
+                    f.write("{} {}\n".format(label, count))
+    print(signed(m.x[10]))
+
+if __name__ == '__main__':
+    main()
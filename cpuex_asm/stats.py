@@ -0,0 +1,108 @@
+import sys
+from time import perf_counter
+
+# hooks called with the Stats of every assembly
+hooks = []
+
+def add_hook(hook):
+    """
+    Register a function to be called with a Stats after every assembly.
+
+    While any hook is registered, every assembly is instrumented.
+    """
+    hooks.append(hook)
+
+def remove_hook(hook):
+    hooks.remove(hook)
+
+class Phase:
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = perf_counter() - self.start
+        self.stats.times[self.name] = self.stats.times.get(self.name, 0.0) + elapsed
+        return False
+
+class Stats:
+    """
+    Metrics of an assembly.
+
+    Attributes
+    ----------
+    times : dict
+        phase name -> wall time in seconds, in the order phases first ran.
+    counts : dict
+        counter name -> value.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+
+    def phase(self, name):
+        """
+        Returns a context manager which adds its wall time to a phase.
+        """
+        return Phase(self, name)
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def finish(self):
+        """
+        Pass the metrics to the registered hooks.
+        """
+        for hook in hooks:
+            hook(self)
+
+    def report(self, f=None):
+        """
+        Print the metrics in a human readable format, to stderr by default.
+        """
+        if f is None:
+            # looked up here, since the server redirects it for each request
+            f = sys.stderr
+        for name, seconds in self.times.items():
+            print("[*] {:<24} {:>10.3f} ms".format(name, seconds * 1000), file=f)
+        for name, value in self.counts.items():
+            print("[*] {:<24} {:>10}".format(name, value), file=f)
+
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class NullStats:
+    """
+    Stats which records nothing, used while instrumentation is disabled.
+    """
+    enabled = False
+    times = {}
+    counts = {}
+
+    def phase(self, name):
+        return NULL_PHASE
+
+    def count(self, name, n=1):
+        pass
+
+    def finish(self):
+        pass
+
+NULL_PHASE = NullPhase()
+NULL_STATS = NullStats()
+
+def new_stats():
+    """
+    Returns a Stats if any hook is registered, otherwise NULL_STATS.
+    """
+    return Stats() if hooks else NULL_STATS
@@ -0,0 +1,168 @@
+import sys
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from .utils import WORD_TYPECODE
+
+# layout of a symbol table (all fields are little endian 32-bit words)
+#
+#   header       : magic, format version, number of symbols (n), number of hash slots (m)
+#   addresses    : n addresses in bytes, in ascending order
+#   name offsets : n + 1 offsets of names in the string pool (the last one is its size)
+#   hash slots   : m slots, each 0 (empty) or 1 + index of a symbol
+#   string pool  : utf-8 names, without separators
+MAGIC = 0x59535843 # b'CXSY'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4I')
+
+def name_hash(name):
+    """
+    Returns the FNV-1a hash (32-bit) of a name in bytes.
+    """
+    h = 0x811c9dc5
+    for c in name:
+        h = ((h ^ c) * 0x01000193) & 0xffffffff
+    return h
+
+def to_words(values):
+    words = array(WORD_TYPECODE, values)
+    if sys.byteorder == 'big':
+        words.byteswap()
+    return words.tobytes()
+
+def build_symbol_table(labels):
+    """
+    Returns a symbol table in binary format.
+
+    Parameters
+    ----------
+    labels : dict
+        label name -> offset (in words).
+
+    Returns
+    -------
+    _ : bytes
+        the symbol table. labels at the same address are kept in definition order.
+    """
+    symbols = sorted(((4 * offset, name.encode()) for name, offset in labels.items()), key=lambda x: x[0])
+    num_slots = 1
+    while num_slots < 2 * len(symbols):
+        num_slots <<= 1
+
+    name_offsets = [0]
+    slots = [0] * num_slots
+    for i, (_, name) in enumerate(symbols):
+        name_offsets.append(name_offsets[-1] + len(name))
+        slot = name_hash(name) & (num_slots - 1)
+        while slots[slot] != 0:
+            slot = (slot + 1) & (num_slots - 1)
+        slots[slot] = i + 1
+
+    return b''.join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, len(symbols), num_slots),
+        to_words(address for address, _ in symbols),
+        to_words(name_offsets),
+        to_words(slots),
+    ] + [name for _, name in symbols])
+
+def write_symbol_table(fname, labels):
+    with open(fname, 'wb') as f:
+        f.write(build_symbol_table(labels))
+
+def read_symbols(fname):
+    """
+    Read <binary>.symbols, and returns label name -> offset (in words).
+    """
+    labels = {}
+    with open(fname) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                labels[fields[0]] = int(fields[1]) // 4
+    return labels
+
+class SymbolIndex:
+    """
+    A symbol table in binary format, mapped into memory.
+
+    Parameters
+    ----------
+    fname : str
+        file name of the symbol table (see build_symbol_table).
+    """
+    def __init__(self, fname):
+        with open(fname, 'rb') as f:
+            self.content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, num_symbols, num_slots = HEADER.unpack_from(self.content)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.content.close()
+            raise ValueError("not a symbol table: {}".format(fname))
+        self.view = memoryview(self.content)
+
+        start = HEADER.size
+        self.addresses = self.words(start, num_symbols)
+        start += 4 * num_symbols
+        self.name_offsets = self.words(start, num_symbols + 1)
+        start += 4 * (num_symbols + 1)
+        self.slots = self.words(start, num_slots)
+        self.pool = start + 4 * num_slots
+
+    def words(self, start, count):
+        view = self.view[start:start + 4 * count]
+        if sys.byteorder == 'little':
+            return view.cast('I')
+        words = array(WORD_TYPECODE, view)
+        words.byteswap()
+        return words
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def name(self, i):
+        """
+        Returns the name of the i-th symbol (in the order of addresses).
+        """
+        return self.content[self.pool + self.name_offsets[i]:self.pool + self.name_offsets[i + 1]].decode()
+
+    def find(self, address):
+        """
+        Returns (name, address) of the nearest symbol at or before an address (in bytes),
+        or None if there is no such symbol. among symbols at the same address,
+        the last defined one is returned.
+        """
+        i = bisect_right(self.addresses, address) - 1
+        if i < 0:
+            return None
+        return self.name(i), self.addresses[i]
+
+    def address(self, name):
+        """
+        Returns the address (in bytes) of a symbol, or None if there is no such symbol.
+        """
+        num_slots = len(self.slots)
+        if num_slots == 0:
+            return None
+        encoded = name.encode()
+        slot = name_hash(encoded) & (num_slots - 1)
+        while self.slots[slot] != 0:
+            i = self.slots[slot] - 1
+            start = self.pool + self.name_offsets[i]
+            if self.content[start:self.pool + self.name_offsets[i + 1]] == encoded:
+                return self.addresses[i]
+            slot = (slot + 1) & (num_slots - 1)
+        return None
+
+    def close(self):
+        for view in [self.addresses, self.name_offsets, self.slots]:
+            if isinstance(view, memoryview):
+                view.release()
+        self.view.release()
+        self.content.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -1,50 +1,76 @@
-from .utils import bit_to_int, int_to_bit
-from .encode import encoder
-from .instructions import instruction_specs
+from .utils import bit_to_int
+from .encode import encoders, imm12_to_bit, imm_to_bit
 
-def encode_ss_j(spec, args, options):    
-    if len(args) != 1:
-        raise IndexError
-    jal_spec = instruction_specs["jal"]
-    return encoder[jal_spec["type"]](jal_spec, ["x0", args[0]], {})
+# specialized encoders (see encode.specialize)
+imm32_to_bit = imm_to_bit(32)
 
-def encode_ss_li(spec, args, options):
-    if len(args) != 2:
-        raise IndexError
-    rd = args[0]
-    try:
-        imm = int_to_bit(args[1], 12)
-        addi_spec = instruction_specs["addi"]
-        return encoder[addi_spec["type"]](addi_spec, [rd, "x0", imm], {})
-    except OverflowError:
-        imm_32 = int_to_bit(args[1], 32)
-        imm_addi = bit_to_int(imm_32 & 0xFFF, 12)
-        imm_lui = bit_to_int((imm_32-imm_addi) & 0xFFFFF000, 32) >> 12
-        lui_spec = instruction_specs["lui"]
-        addi_spec = instruction_specs["addi"]
-        return encoder[lui_spec["type"]](lui_spec, [rd, imm_lui], {}) + \
-            encoder[addi_spec["type"]](addi_spec, [rd, rd, imm_addi], {})
+def specialize_ss_j(spec):
+    encode_jal = encoders["jal"]
+    def encode(args, options):
+        if len(args) != 1:
+            raise IndexError
+        return encode_jal([0, args[0]], options)
+    return encode
 
-def encode_ss_liu(spec, args, options):
-    if len(args) != 2:
-        raise IndexError
-    lui_spec = instruction_specs["lui"]
-    return encoder[lui_spec["type"]](lui_spec, args)
+def specialize_ss_call(spec):
+    encode_jal = encoders["jal"]
+    def encode(args, options):
+        if len(args) != 1:
+            raise IndexError
+        return encode_jal([1, args[0]], options)
+    return encode
+
+def specialize_ss_li(spec):
+    encode_lui = encoders["lui"]
+    encode_addi = encoders["addi"]
+    def encode(args, options):
+        if len(args) != 2:
+            raise IndexError
+        rd = args[0]
+        try:
+            return encode_addi([rd, 0, imm12_to_bit(args[1])], {})
+        except OverflowError:
+            imm_32 = imm32_to_bit(args[1])
+            imm_addi = bit_to_int(imm_32 & 0xFFF, 12)
+            imm_lui = bit_to_int((imm_32-imm_addi) & 0xFFFFF000, 32) >> 12
+            return encode_lui([rd, imm_lui], {}) + \
+                encode_addi([rd, rd, imm_addi], {})
+    return encode
+
+def specialize_ss_liu(spec):
+    encode_lui = encoders["lui"]
+    def encode(args, options):
+        if len(args) != 2:
+            raise IndexError
+        return encode_lui(args, {})
+    return encode
 
 syntax_sugar_specs = {
     "j": {
         "arg_num": 1,
         "type": "j",
-        "encoder": encode_ss_j,
+        "specializer": specialize_ss_j,
+    },
+    # jal ra, label, or auipc ra + jalr ra if it is far
+    "call": {
+        "arg_num": 1,
+        "type": "j",
+        "specializer": specialize_ss_call,
+    },
+    # j, which is spelled out as a tail call (auipc t1 + jalr zero if it is far)
+    "tail": {
+        "arg_num": 1,
+        "type": "j",
+        "specializer": specialize_ss_j,
     },
     "li": {
         "arg_num": 2,        
         "type": "i",
-        "encoder": encode_ss_li,
+        "specializer": specialize_ss_li,
     },
     "liu": {
         "arg_num": 2,
         "type": "i",
-        "encoder": encode_ss_liu,
+        "specializer": specialize_ss_liu,
     },
 }
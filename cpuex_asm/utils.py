@@ -1,21 +1,63 @@
+import sys
+from array import array
+
+# typecode of an array of 32-bit words
+WORD_TYPECODE = 'I' if array('I').itemsize == 4 else 'L'
+# typecode of an array of offsets and sizes
+INDEX_TYPECODE = 'l'
+
 def to_int(s):
     if isinstance(s, int):
         return s
     return int(s[2:], 16) if s.startswith("0x") else int(s)
 
 def bit_to_int(s, bitwidth):    
-    return s if s < 2 ** (bitwidth-1) else s - 2 ** bitwidth
+    return s if s < 1 << (bitwidth-1) else s - (1 << bitwidth)
     
 def int_to_bit(s, bitwidth):
     # here we assume MSB is for sign
     s = to_int(s) 
     if 0 <= s:
-        if s < 2 ** (bitwidth-1):
+        if s < 1 << (bitwidth-1):
             return s
         else:
             raise OverflowError
     else: # s is a negative number
-        if 0 <= 2 ** (bitwidth-1) + s:
-            return 2 ** bitwidth + s
+        if 0 <= (1 << (bitwidth-1)) + s:
+            return (1 << bitwidth) + s
         else:
             raise OverflowError
+
+def new_words(size=0):
+    """
+    Returns a zero-filled array of 32-bit words.
+    """
+    return array(WORD_TYPECODE, [0]) * size
+
+def new_indices(values=()):
+    """
+    Returns an array of offsets (or sizes) initialized with values.
+    """
+    return array(INDEX_TYPECODE, values)
+
+def words_to_bytes(words):
+    """
+    Returns an array of 32-bit words in little endian.
+    """
+    if sys.byteorder == 'little':
+        return words.tobytes()
+    swapped = array(WORD_TYPECODE, words)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+def write_words(f, words):
+    """
+    Write an array of 32-bit words to a binary file in little endian.
+    """
+    if sys.byteorder == 'little':
+        with memoryview(words) as view:
+            f.write(view)
+    else:
+        swapped = array(WORD_TYPECODE, words)
+        swapped.byteswap()
+        f.write(swapped)
@@ -1,15 +1,18 @@
 from setuptools import setup, find_packages
+from cpuex_asm import __version__
 
 setup(
     name='cpuex_asm',
-    version="0.0.4",
+    version=__version__,
     author='Takashi Yoneuchi',
     author_email='takahsi.yoneuchi@shift-js.info',
     packages = ['cpuex_asm'],
     entry_points={
         "console_scripts": [
-            "cpuex_asm=cpuex_asm.asm:main",
-            "cpuex_bin2coe=cpuex_asm.bin2coe:main"
+            "cpuex_asm=cpuex_asm.client:main",
+            "cpuex_bin2coe=cpuex_asm.bin2coe:main",
+            "cpuex_disasm=cpuex_asm.disasm:main",
+            "cpuex_asm_sim=cpuex_asm.sim:main"
         ]
     },
 )
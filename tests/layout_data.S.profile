@@ -0,0 +1,3 @@
+main 1
+hot 1
+end 1
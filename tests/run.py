@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Regression tests: assemble, disassemble and execute each tests/*.S in a pool of processes,
+and compare them with <test>.disasm.expected, <test>.exec.expected and <test>.uart.expected.
+If <test>.flags exists, the test is assembled by cpuex_asm with these options
+(e.g. --thread-jumps), in the directory of the test.
+
+Everything runs in process (see cpuex_asm.sim), and the outputs of each test are
+written to a temporary directory of its own, which is kept if it fails and --keep is given.
+
+    python3 tests/run.py [tests/foo.S ...] [-j N] [--json results.json] [--keep]
+"""
+import io
+import os
+import sys
+import glob
+import json
+import time
+import shlex
+import shutil
+import difflib
+import tempfile
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+DEFAULT_MAX_STEPS = 10 ** 8
+
+def read_lines(fname):
+    with open(fname, errors='replace') as f:
+        return f.read().splitlines()
+
+def normalize(lines):
+    # as diff -b: the amount of white space and trailing blank lines do not matter
+    lines = [' '.join(line.split()) for line in lines]
+    while lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+def compare(expected_file, actual, actual_file):
+    """
+    Returns None if the lines are the same, or their diff.
+    """
+    expected = read_lines(expected_file)
+    if normalize(expected) == normalize(actual):
+        return None
+    return '\n'.join(difflib.unified_diff(expected, actual, expected_file, actual_file, lineterm=''))
+
+def assemble_with_flags(source, flags, binary):
+    """
+    Run cpuex_asm with given options, and returns (image, symbols), or None and the error.
+    """
+    from cpuex_asm.asm import main
+    cwd = os.getcwd()
+    output = io.StringIO()
+    try:
+        os.chdir(os.path.dirname(source))
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(io.StringIO()):
+            main(flags + ['--no-cache', binary, source])
+    except SystemExit:
+        return None, output.getvalue().strip()
+    finally:
+        os.chdir(cwd)
+    with open(binary, 'rb') as f:
+        image = f.read()
+    with open(binary + '.symbols') as f:
+        symbols = f.read()
+    return (image, symbols), None
+
+def run_test(source, max_steps=DEFAULT_MAX_STEPS, keep=False):
+    """
+    Run a test in this process, and returns the result.
+    """
+    from cpuex_asm import AsmError
+    from cpuex_asm.asm import link_files
+    from cpuex_asm.disasm import disasm
+    from cpuex_asm.sim import Machine, SimError, signed
+
+    workdir = tempfile.mkdtemp(prefix=os.path.basename(source) + '.')
+    binary = os.path.join(workdir, 'a.bin')
+    result = {"test": source, "checks": {}, "seconds": {}, "diffs": {}, "workdir": None}
+
+    def check(name, expected_file, actual, actual_name):
+        actual_file = os.path.join(workdir, actual_name)
+        with open(actual_file, 'w') as f:
+            f.write('\n'.join(actual) + '\n')
+        diff = compare(expected_file, actual, actual_file)
+        result["checks"][name] = diff is None
+        if diff is not None:
+            result["diffs"][name] = diff
+
+    def failed(name, message):
+        result["checks"][name] = False
+        result["diffs"][name] = message
+
+    start = time.perf_counter()
+    assembled = None
+    try:
+        if os.path.exists(source + '.flags'):
+            with open(source + '.flags') as f:
+                flags = shlex.split(f.read(), comments=True)
+            assembled, error = assemble_with_flags(os.path.abspath(source), flags, binary)
+            if error is not None:
+                failed("asm", error)
+        else:
+            # long jumps are reported, which is not what we test
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                asm_result = link_files([source])
+            assembled = asm_result.tobytes(), asm_result.symbols()
+    except AsmError as e:
+        failed("asm", "[-] {}".format(e))
+    except Exception as e:
+        # not to stop the other tests
+        failed("asm", "[-] {}: {}".format(type(e).__name__, e))
+    result["seconds"]["asm"] = time.perf_counter() - start
+
+    if assembled is not None:
+        image, symbols = assembled
+        with open(binary, 'wb') as f:
+            f.write(image)
+        with open(binary + '.symbols', 'w') as f:
+            f.write(symbols)
+
+        if os.path.exists(source + '.disasm.expected'):
+            start = time.perf_counter()
+            # without the annotations of jump targets
+            check("disasm", source + '.disasm.expected',
+                  [line.split(';')[0] for line in disasm(image)], 'a.disasm')
+            result["seconds"]["disasm"] = time.perf_counter() - start
+
+        if os.path.exists(source + '.exec.expected'):
+            received = b''
+            if os.path.exists(source + '.input'):
+                with open(source + '.input', 'rb') as f:
+                    received = f.read()
+            start = time.perf_counter()
+            try:
+                m = Machine(image, received)
+                result["instructions"] = m.run(max_steps)
+                check("exec", source + '.exec.expected', [str(signed(m.x[10]))], 'a.exec')
+                if os.path.exists(source + '.uart.expected'):
+                    check("uart", source + '.uart.expected',
+                          m.uart.transmitted.decode('latin-1').splitlines(), 'a.uart')
+            except SimError as e:
+                failed("exec", "[-] {}".format(e))
+            result["seconds"]["exec"] = time.perf_counter() - start
+
+    result["passed"] = all(result["checks"].values())
+    if keep and not result["passed"]:
+        result["workdir"] = workdir
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+def colored(text, is_ok):
+    return "\x1b[{}m{}\x1b[m".format(32 if is_ok else 31, text)
+
+def report(result):
+    for name, is_ok in result["checks"].items():
+        print(colored("{}: {} {}.".format(result["test"], name, "passed" if is_ok else "failed"), is_ok))
+        if not is_ok:
+            print(result["diffs"][name])
+    print("    {}".format(", ".join("{} {:.1f} ms".format(name, 1000 * seconds)
+                                    for name, seconds in result["seconds"].items())))
+    if result["workdir"] is not None:
+        print("    outputs are kept in {}".format(result["workdir"]))
+
+def main():
+    parser = argparse.ArgumentParser(description='run regression tests under tests/.')
+    parser.add_argument('tests', nargs='*', help='sources to be tested (default: tests/*.S)')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='run tests with N processes (default: as many as CPUs)', metavar='N')
+    parser.add_argument('--json', help='write a summary in JSON to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the outputs of failed tests')
+    parser.add_argument('--max-steps', type=int, default=DEFAULT_MAX_STEPS,
+                        help='fail a test which executes more instructions than this (default: %(default)s)')
+    args = parser.parse_args()
+
+    tests = args.tests or sorted(glob.glob(os.path.join(os.path.relpath(TESTS_DIR), '*.S')))
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+
+    print("[+] Test: run all src under tests/ .")
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=min(jobs, max(len(tests), 1))) as pool:
+        futures = [pool.submit(run_test, test, args.max_steps, args.keep) for test in tests]
+        # reported in order of the tests, as they finish
+        for future in futures:
+            result = future.result()
+            report(result)
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    passed = sum(1 for result in results if result["passed"])
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump({
+                "passed": passed,
+                "failed": len(results) - passed,
+                "seconds": elapsed,
+                "tests": results,
+            }, f, indent=2)
+
+    if passed == len(results):
+        print(colored("[+] Yay! testing passed. ({} tests in {:.2f} s)".format(len(results), elapsed), True))
+    else:
+        print(colored("[-] Oops, testing failed. ({} of {} tests in {:.2f} s)".format(
+            len(results) - passed, len(results), elapsed), False))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()